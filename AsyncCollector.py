@@ -0,0 +1,57 @@
+import asyncio, signal
+
+from ServerLog import log
+
+
+class CollectorProtocol(asyncio.DatagramProtocol):
+    """Feeds every datagram through the Collector pipeline and sends the handshake reply."""
+
+    def __init__(self, collector):
+        self.collector = collector
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        reply = self.collector.handle_datagram(data, addr)
+        if reply is not None:
+            self.transport.sendto(reply, addr)
+
+    def error_received(self, exc):
+        log.error(exc)
+
+
+async def run_periodic(handler):
+    """Runs one handler's tick (flush, metrics snapshot, heartbeat sweep) on its own timer."""
+    while True:
+        await asyncio.sleep(handler.tick_interval)
+        try:
+            handler.tick()
+        except Exception as e:
+            log.error(e)
+
+
+async def run_async(collector, host="0.0.0.0", port=9999, reuse_port=False, label="Server"):
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: CollectorProtocol(collector), local_addr=(host, port),
+        reuse_port=reuse_port or None
+    )
+    print(f"{label} started... (asyncio)", flush=True)
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass    # not available on Windows event loops
+
+    tasks = [asyncio.create_task(run_periodic(h)) for h in collector.tickers]
+    try:
+        await stop.wait()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        transport.close()
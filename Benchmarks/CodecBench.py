@@ -0,0 +1,68 @@
+"""Per-packet decode cost: the old format-string/per-value path vs Protocol.py,
+and the verification cost of each negotiable integrity check.
+
+    python3 Benchmarks/CodecBench.py [--iterations 200000]
+"""
+import argparse, os, struct, sys, timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Protocol import (HEADER_FORMAT, CHECKSUM_SIZE, CHECKSUM_SIZES, MSG_DATA, INTEGRITY_ALGORITHMS,
+                      encode_packet, unpack_header, unpack_values, compute_checksum)
+
+
+def decode_legacy(packet):
+    # what Server.py did before the shared codec
+    data = packet[:-16]
+    checksum = packet[-16:]
+    header_size = struct.calcsize(HEADER_FORMAT)
+    version, msg_type, count, sensor_type, dev_id, seq, timestamp = struct.unpack(
+        HEADER_FORMAT, data[:header_size]
+    )
+    index = header_size
+    values = []
+    for _ in range(count):
+        v = struct.unpack('!f', data[index:index+4])[0]
+        index += 4
+        values.append(v)
+    return count, values, checksum
+
+
+def decode_codec(packet):
+    view = memoryview(packet)
+    size = len(view)
+    checksum = view[size - CHECKSUM_SIZE:]
+    version, msg_type, count, sensor_type, dev_id, seq, timestamp = unpack_header(view)
+    values = unpack_values(view, count)
+    return count, values, checksum
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+
+    print(f"{'values':>6} {'legacy ns/pkt':>14} {'codec ns/pkt':>13} {'speedup':>8}")
+    for count in (1, 3, 10, 42):
+        packet = encode_packet(MSG_DATA, 0, 1, 1, [20.0 + i for i in range(count)])
+        assert list(decode_legacy(packet)[1]) == list(decode_codec(packet)[1])
+
+        legacy = min(timeit.repeat(lambda: decode_legacy(packet), number=args.iterations, repeat=3))
+        codec = min(timeit.repeat(lambda: decode_codec(packet), number=args.iterations, repeat=3))
+        legacy_ns = legacy / args.iterations * 1e9
+        codec_ns = codec / args.iterations * 1e9
+        print(f"{count:>6} {legacy_ns:>14.0f} {codec_ns:>13.0f} {legacy_ns / codec_ns:>7.2f}x")
+
+    print()
+    print(f"{'integrity':>9} {'bytes':>6} {'ns/pkt (3 values)':>18}")
+    for name, integrity in INTEGRITY_ALGORITHMS.items():
+        packet = encode_packet(MSG_DATA, 0, 1, 1, [20.0, 21.0, 22.0], integrity=integrity)
+        size = CHECKSUM_SIZES[integrity]
+        data, checksum = memoryview(packet)[:-size], packet[-size:]
+        elapsed = min(timeit.repeat(lambda: compute_checksum(data, integrity) == checksum,
+                                    number=args.iterations, repeat=3))
+        print(f"{name:>9} {size:>6} {elapsed / args.iterations * 1e9:>18.0f}")
+
+
+if __name__ == "__main__":
+    main()
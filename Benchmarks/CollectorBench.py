@@ -0,0 +1,244 @@
+"""End-to-end collector benchmark: Server.py against LoadGenerator.py over a sweep.
+
+    python3 Benchmarks/CollectorBench.py --rates 5000,20000,50000 --devices 100,1000 --batches 1,8 \\
+        --duration 5 --out results.json
+    python3 Benchmarks/CollectorBench.py --compare baseline.json results.json [--threshold 10]
+
+Every point starts a fresh server in a temporary directory on a free port,
+registers the devices, sends at the offered rate for --duration seconds,
+stops the server (which publishes a final Metrics.csv) and records what the
+server saw. --server-args is passed to every server; write it with "=" so a
+value starting with a dash is not taken for an option of this script:
+--server-args="--recv-batch 1", --server-args=--profile-stages.
+With --compare, points with the same rate / devices / batch are matched and
+the command exits with 1 when one of them regressed beyond the threshold.
+
+The traffic is unimpaired loopback, so every loss the server reports must
+be a packet that never reached it (false_loss = lost - not received). A
+point of the new run with false loss fails --compare on its own: the
+collector is miscounting and its other numbers cannot be trusted.
+"""
+import argparse, csv, datetime, json, os, platform, random, shlex, signal, socket, subprocess, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import LoadGenerator
+from Protocol import INTEGRITY_ALGORITHMS
+
+SERVER = os.path.join(ROOT, "Server.py")
+POINT_KEYS = ("rate", "devices", "batch")
+
+# (result field, direction): +1 = higher is worse, -1 = lower is worse
+COMPARED = (("received_rate", -1), ("cpu_ms_per_report", 1), ("delay_p99_ms", 1),
+            ("process_p99_us", 1), ("drop_rate", 1))
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def socket_drops(port):
+    """Datagrams the kernel dropped on the server's receive buffer(s) (Linux only, None elsewhere)."""
+    try:
+        with open("/proc/net/udp") as f:
+            rows = f.read().splitlines()[1:]
+    except OSError:
+        return None
+    suffix = ":%04X" % port
+    return sum(int(row.split()[-1]) for row in rows if row.split()[1].endswith(suffix))
+
+
+def read_rows(path):
+    try:
+        with open(path, newline='') as f:
+            return list(csv.DictReader(f))
+    except OSError:
+        return []
+
+
+def read_metrics(path):
+    rows = read_rows(path)
+    return rows[-1] if rows else {}
+
+
+def run_point(rate, devices, batch, args):
+    port = free_port()
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "server.out"), "w") as out:
+            server = subprocess.Popen(
+                [sys.executable, SERVER, "--port", str(port), "--live-port", "0", "--quiet",
+                 *shlex.split(args.server_args)],
+                cwd=directory, stdout=out, stderr=subprocess.STDOUT)
+        fleet = []
+        try:
+            time.sleep(args.startup)
+            target = ("127.0.0.1", port)
+            fleet = LoadGenerator.build_devices(devices, [(0, 1), (1, 1), (2, 1)],
+                                                INTEGRITY_ALGORITHMS[args.integrity],
+                                                random.Random(args.seed))
+            fleet = LoadGenerator.handshake(fleet, target, base_port=args.base_port)
+            drops_before = socket_drops(port)
+            sent = LoadGenerator.run(fleet, target, rate, args.duration, burst=args.burst,
+                                     batch_max=batch, batch_min=batch, batch_every=1 if batch > 1 else 0,
+                                     heartbeat_every=args.heartbeat_every, seed=args.seed, progress=False)
+            time.sleep(args.drain)
+            drops_after = socket_drops(port)
+        finally:
+            LoadGenerator.close_devices(fleet)
+            server.send_signal(signal.SIGINT)
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+        metrics = read_metrics(os.path.join(directory, "Metrics.csv"))
+        # exact lost count: Metrics.csv only has the rounded percentage
+        lost = sum(int(row["Lost"]) for row in read_rows(os.path.join(directory, "TypeMetrics.csv")))
+
+    # INIT packets are counted by the server but not by the generator
+    received = max(0, int(metrics.get("packets_received", 0)) - len(fleet))
+    packets_sent = sent["packets_sent"]
+
+    def number(name):
+        try:
+            return float(metrics[name])
+        except (KeyError, ValueError):
+            return None
+
+    return {
+        "rate": rate, "devices": devices, "batch": batch,
+        "registered": len(fleet),
+        "packets_sent": packets_sent,
+        "achieved_rate": sent["achieved_rate"],
+        "generator_lag_ms": sent["max_lag_ms"],
+        "packets_received": received,
+        "received_rate": round(received / sent["duration_s"], 1) if sent["duration_s"] else 0,
+        "drop_rate": round(1 - received / packets_sent, 4) if packets_sent else 0,
+        "socket_drops": None if drops_before is None else drops_after - drops_before,
+        "server_lost": lost,
+        "false_loss": max(0, lost - max(0, packets_sent - received)),
+        "cpu_ms_per_report": number("cpu_ms_per_report"),
+        "avg_recv_batch": number("avg_recv_batch"),
+        "delay_p50_ms": number("delay_p50_ms"),
+        "delay_p99_ms": number("delay_p99_ms"),
+        "delay_p999_ms": number("delay_p999_ms"),
+        "process_p50_us": number("process_p50_us"),
+        "process_p99_us": number("process_p99_us"),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def sweep(args):
+    LoadGenerator.raise_fd_limit(max(int(d) for d in args.devices.split(",")) + 64)
+    rates = [float(r) for r in args.rates.split(",")]
+    device_counts = [int(d) for d in args.devices.split(",")]
+    batches = [int(b) for b in args.batches.split(",")]
+    results = []
+    print(f"{'rate':>9} {'devices':>8} {'batch':>6} {'sent/s':>9} {'recv/s':>9} {'drop':>7} {'sock drops':>10} "
+          f"{'cpu ms':>7} {'delay p99':>9} {'proc p99':>9} {'false loss':>10}")
+    for rate in rates:
+        for devices in device_counts:
+            for batch in batches:
+                r = run_point(rate, devices, batch, args)
+                results.append(r)
+                print(f"{rate:>9.0f} {devices:>8} {batch:>6} {r['achieved_rate']:>9.0f} {r['received_rate']:>9.0f} "
+                      f"{r['drop_rate']:>7.2%} {r['socket_drops'] if r['socket_drops'] is not None else '-':>10} "
+                      f"{r['cpu_ms_per_report'] or 0:>7.3f} {r['delay_p99_ms'] or 0:>9.1f} "
+                      f"{r['process_p99_us'] or 0:>9.1f} {r['false_loss']:>10}", flush=True)
+
+    document = {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "server_args": args.server_args,
+            "duration": args.duration, "burst": args.burst, "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(document, f, indent=2)
+    print(f"results written to {args.out}")
+
+
+def compare(base_path, new_path, threshold, drop_threshold):
+    """Prints the change of every COMPARED field per point; returns the number of regressions."""
+    with open(base_path) as f:
+        base = {tuple(r[k] for k in POINT_KEYS): r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = {tuple(r[k] for k in POINT_KEYS): r for r in json.load(f)["results"]}
+
+    regressions = 0
+    for key in sorted(new):
+        false_loss = new[key].get("false_loss")
+        if false_loss:
+            regressions += 1
+            print(f"{', '.join(f'{k}={v:g}' for k, v in zip(POINT_KEYS, key)):<32} false_loss "
+                  f"{false_loss} packets reported lost that were delivered  FALSE LOSS")
+    for key in sorted(base.keys() & new.keys()):
+        label = ", ".join(f"{k}={v:g}" for k, v in zip(POINT_KEYS, key))
+        for name, direction in COMPARED:
+            old, current = base[key].get(name), new[key].get(name)
+            if old is None or current is None:
+                continue
+            if name == "drop_rate":
+                # absolute: 0.1 % -> 0.3 % is noise, 0 % -> 5 % is not
+                worse = (current - old) * direction > drop_threshold
+                change = f"{(current - old) * 100:+.2f} pts"
+            else:
+                delta = (current - old) / old * 100 if old else 0.0
+                worse = delta * direction > threshold
+                change = f"{delta:+.1f} %"
+            flag = "REGRESSION" if worse else ""
+            regressions += worse
+            print(f"{label:<32} {name:<18} {old:>12g} -> {current:<12g} {change:>12} {flag}")
+    for key in sorted(base.keys() ^ new.keys()):
+        print(f"{', '.join(f'{k}={v:g}' for k, v in zip(POINT_KEYS, key)):<32} only in "
+              f"{'baseline' if key in base else 'new run'}")
+    print(f"{regressions} regression(s) beyond {threshold:g} % / {drop_threshold * 100:g} pts of drops "
+          f"or with false loss")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rates", default="2000,10000,40000", help="offered packets/s, comma separated")
+    parser.add_argument("--devices", default="100,1000", help="virtual device counts, comma separated")
+    parser.add_argument("--batches", default="1,8", help="values per data packet, comma separated")
+    parser.add_argument("--duration", type=float, default=5, help="seconds of traffic per point")
+    parser.add_argument("--burst", type=int, default=1)
+    parser.add_argument("--heartbeat-every", type=int, default=5)
+    parser.add_argument("--integrity", choices=INTEGRITY_ALGORITHMS, default="md5")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--base-port", type=int, default=20000, help="first source port of the handshakes")
+    parser.add_argument("--server-args", default="", help='extra Server.py options for every point, as --server-args="--recv-batch 1"')
+    parser.add_argument("--startup", type=float, default=1.0, help="seconds the server gets to bind")
+    parser.add_argument("--drain", type=float, default=1.0, help="seconds between the last send and the stop")
+    parser.add_argument("--out", default="collector_bench.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "NEW"),
+                        help="compare two results files instead of running")
+    parser.add_argument("--threshold", type=float, default=10,
+                        help="relative change (%%) that counts as a regression")
+    parser.add_argument("--drop-threshold", type=float, default=0.01,
+                        help="absolute drop rate increase that counts as a regression (0.01 = 1 pt)")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold, args.drop_threshold) else 0)
+    sweep(args)
+
+
+if __name__ == "__main__":
+    main()
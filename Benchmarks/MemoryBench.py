@@ -0,0 +1,123 @@
+"""Per-device memory of the collector state: the original Server.py layout (five
+module-level dicts, two lists per device) vs a device as the server builds it now.
+
+    python3 Benchmarks/MemoryBench.py [--devices 2000] [--packets 100] [--fill mean] [--seq-window 256]
+        [--device-metrics-interval 5]
+
+The original side holds a device that has been running for a while: full
+value history, last arrival and heartbeat set. The server side runs real
+INIT and data packets through Collector.handle_datagram(), round robin over
+the devices with sensor delays of 1-50 ms, and counts everything that stays
+allocated: DeviceState, SequenceTracker, the metrics rows and, unless
+--device-metrics-interval is 0 (the Server.py default is 5), the three
+per-device Histograms. It is measured with and without those histograms.
+The original layout only remembered the last 5 sequence numbers; the
+SequenceTracker covers --seq-window of them.
+"""
+import argparse, os, random, sys, tempfile, time, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Collector import Collector, FILL_STRATEGIES, valueHistoryLimit
+from Protocol import MSG_INIT, MSG_DATA, MSG_HEARTBEAT, encode_packet, unpack_header
+from ServerLog import log, ERROR
+
+PACKETS = 1000      # packets each original-layout device has sent before the measurement
+RECENT_PACKET_LIMIT = 5
+HEARTBEAT_EVERY = 5
+
+
+def address(dev_id):
+    return f"10.{dev_id >> 16 & 255}.{dev_id >> 8 & 255}.{dev_id & 255}", 40000
+
+
+def build_original(devices):
+    # the baseline Server.py globals: device_map, recentPackets, value_history, last_arrival, last_heartbeat
+    device_map, recent_packets, value_history, last_arrival, last_heartbeat = {}, {}, {}, {}, {}
+    for dev_id in range(1, devices + 1):
+        device_map[(address(dev_id), dev_id % 3)] = dev_id
+        recent_packets[dev_id] = [PACKETS - i for i in range(RECENT_PACKET_LIMIT, 0, -1)]
+        value_history[dev_id] = [20.0 + i * 0.1 for i in range(5)]
+        last_arrival[dev_id] = 1700000000000 + dev_id
+        last_heartbeat[dev_id] = 1700000000.0 + dev_id
+    return device_map, recent_packets, value_history, last_arrival, last_heartbeat
+
+
+def measure_original(devices):
+    tracemalloc.start()
+    state = build_original(devices)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del state
+    return current, peak
+
+
+def measure_server(devices, packets, fill, seq_window, device_metrics_interval):
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as directory:
+        def path(name):
+            return os.path.join(directory, name)
+
+        collector = Collector(path("SensorsLogs.csv"), path("Metrics.csv"), path("Gaps.csv"), path("Readings.log"),
+                              fill=fill, seq_window=seq_window, history_window=valueHistoryLimit,
+                              device_metrics_file=path("DeviceMetrics.csv"),
+                              device_metrics_interval=device_metrics_interval,
+                              type_metrics_file=path("TypeMetrics.csv"), stages_file=path("StageProfile.csv"))
+        # fixed costs (writers, snapshotter, pipeline) are not per device
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+
+        ids = []
+        for i in range(1, devices + 1):
+            reply = collector.handle_datagram(encode_packet(MSG_INIT, i % 3, 0, 0), address(i))
+            ids.append(unpack_header(reply)[4])
+        for seq in range(1, packets + 1):
+            for i, dev_id in enumerate(ids, 1):
+                sent = int(time.time() * 1000) - rng.randint(1, 50)
+                if seq % HEARTBEAT_EVERY == 0:
+                    packet = encode_packet(MSG_HEARTBEAT, i % 3, dev_id, seq, timestamp=sent)
+                else:
+                    packet = encode_packet(MSG_DATA, i % 3, dev_id, seq, (rng.uniform(15.0, 35.0),), timestamp=sent)
+                collector.handle_datagram(packet, address(i))
+                if i % 64 == 0:
+                    collector.tick()    # flushes and snapshots, as the server loop does between wakeups
+
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        collector.close()
+    return current - before, peak - before
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--packets", type=int, default=100, help="packets per device on the server side")
+    parser.add_argument("--fill", choices=FILL_STRATEGIES, default="mean")
+    parser.add_argument("--seq-window", type=int, default=256)
+    parser.add_argument("--device-metrics-interval", type=float, default=5.0,
+                        help="as Server.py: 0 = no per-device histograms")
+    args = parser.parse_args()
+    log.level = ERROR       # no console lines while measuring
+
+    layouts = [("original", lambda: measure_original(args.devices))]
+    intervals = [args.device_metrics_interval] + ([0] if args.device_metrics_interval else [])
+    for interval in intervals:
+        name = "server" if interval else "server, no device histograms"
+        layouts.append((name, lambda interval=interval: measure_server(args.devices, args.packets, args.fill,
+                                                                       args.seq_window, interval)))
+
+    print(f"{'layout':>29} {'bytes/device':>13} {'peak bytes/device':>18}")
+    results = {}
+    for name, measure in layouts:
+        current, peak = measure()
+        results[name] = current / args.devices
+        print(f"{name:>29} {current / args.devices:>13.0f} {peak / args.devices:>18.0f}")
+    for name in results:
+        if name != "original":
+            change = (results[name] - results["original"]) / results["original"] * 100
+            print(f"{name} vs original: {change:+.1f} % per device "
+                  f"(fill={args.fill}, seq window={args.seq_window})")
+
+
+if __name__ == "__main__":
+    main()
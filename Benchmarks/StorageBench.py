@@ -0,0 +1,66 @@
+"""Load time of the same readings from SensorsLogs.csv vs the npy column segments.
+
+    python3 Benchmarks/StorageBench.py [--rows 500000]
+
+pandas / numpy timings are added when those packages are installed.
+"""
+import argparse, csv, os, random, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ReadingsWriter import ReadingsWriter
+from ColumnStore import ColumnarWriter, read_readings, load_dataframe
+from Collector import READINGS_HEADER
+
+
+def generate(directory, rows):
+    writer = ReadingsWriter(os.path.join(directory, "SensorsLogs.csv"), header=READINGS_HEADER, flush_rows=4096)
+    columns = ColumnarWriter(os.path.join(directory, "Readings"), flush_rows=4096, segment_rows=200000)
+    ts = 1700000000000
+    for seq in range(rows):
+        value = 20.0 + random.random() * 10
+        writer.write_row([0, seq % 50 + 1, seq & 0xFFFF, ts + seq, round((ts + seq) / 1000, 3),
+                          "DATA", f"{value:.2f}", "", "", 0, False, 1])
+        columns.write_values(0, seq % 50 + 1, seq & 0xFFFF, 1, ts + seq, ts + seq, (value,))
+    writer.close()
+    columns.close()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        generate(directory, args.rows)
+        csv_path = os.path.join(directory, "SensorsLogs.csv")
+        npy_path = os.path.join(directory, "Readings")
+
+        def load_csv():
+            with open(csv_path, newline='') as f:
+                reader = csv.reader(f)
+                next(reader)
+                return [float(row[6]) for row in reader]
+
+        results = [("csv module", *timed(load_csv)),
+                   ("npy (array)", *timed(lambda: read_readings(npy_path)["value"]))]
+        try:
+            import pandas as pd
+            results.append(("pd.read_csv", *timed(lambda: pd.read_csv(csv_path)["Temperature"])))
+            results.append(("npy (pandas)", *timed(lambda: load_dataframe(npy_path)["value"])))
+        except ImportError:
+            print("(pandas / numpy not installed, skipping their timings)")
+
+        print(f"{'loader':>13} {'seconds':>9} {'rows':>9}")
+        for name, elapsed, values in results:
+            print(f"{name:>13} {elapsed:>9.3f} {len(values):>9}")
+
+
+if __name__ == "__main__":
+    main()
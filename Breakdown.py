@@ -0,0 +1,116 @@
+import heapq
+from array import array
+
+# Per-device and per-sensor-type counters.
+#
+# One array('q') column per counter and one row per key (dev_id or sensor
+# type): the hot path keeps the row index on its DeviceState and does
+# `table.received[row] += 1`, with no dict or per-row object. Rows changed
+# since the last ranking are remembered in `touched`, so the worst devices
+# are re-scored incrementally instead of sorting every device per snapshot.
+
+COUNTERS = ("received", "lost", "duplicates", "gaps", "bytes",
+            "delay_sum", "interval_sum", "interval_count")
+
+BREAKDOWN_FIELDS = ["Received", "Lost", "Loss %", "Duplicates", "Gaps", "Bytes",
+                    "Avg Delay ms", "Avg Interval ms"]
+
+
+class CounterTable:
+    """Array-backed counters by key; row() hands out a fixed row index per key."""
+
+    __slots__ = ("keys", "index", "touched", "ranking") + COUNTERS
+
+    def __init__(self):
+        self.keys = []
+        self.index = {}             # {key: row}
+        self.touched = set()        # rows whose loss rate may have changed since the last worst()
+        self.ranking = TopK()
+        for name in COUNTERS:
+            setattr(self, name, array('q'))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def row(self, key):
+        row = self.index.get(key)
+        if row is None:
+            row = self.index[key] = len(self.keys)
+            self.keys.append(key)
+            for name in COUNTERS:
+                getattr(self, name).append(0)
+        return row
+
+    def loss_percent(self, row):
+        lost, received = self.lost[row], self.received[row]
+        return lost / (lost + received) * 100 if lost + received > 0 else 0
+
+    def summary(self, row):
+        """BREAKDOWN_FIELDS values of one row."""
+        received, intervals = self.received[row], self.interval_count[row]
+        return [received, self.lost[row], round(self.loss_percent(row), 3), self.duplicates[row],
+                self.gaps[row], self.bytes[row],
+                round(self.delay_sum[row] / received, 3) if received else 0,
+                round(self.interval_sum[row] / intervals, 3) if intervals else 0]
+
+    def worst(self, k):
+        """[(loss %, lost, key)] of the k rows with the highest loss rate, lossless rows left out."""
+        ranking = self.ranking
+        for row in self.touched:
+            ranking.update(row, (self.loss_percent(row), self.lost[row]))
+        self.touched.clear()
+        return [(score[0], score[1], self.keys[row]) for score, row in ranking.top(k) if score[1] > 0]
+
+    # ---- merging (SO_REUSEPORT workers) ----
+    def state(self):
+        return list(self.keys), [getattr(self, name).tolist() for name in COUNTERS]
+
+    def merge_state(self, state):
+        keys, columns = state
+        rows = [self.row(key) for key in keys]
+        for name, values in zip(COUNTERS, columns):
+            column = getattr(self, name)
+            for row, v in zip(rows, values):
+                column[row] += v
+        self.touched.update(rows)
+
+
+class TopK:
+    """Highest scores by key, kept up to date one update() at a time.
+
+    Every update pushes onto a max-heap; entries whose score is no longer
+    current are skipped when they surface, and the heap is rebuilt once the
+    stale entries outnumber the live ones.
+    """
+
+    __slots__ = ("scores", "heap")
+
+    def __init__(self):
+        self.scores = {}        # {key: current score}
+        self.heap = []          # (negated score, key)
+
+    def update(self, key, score):
+        if self.scores.get(key) == score:
+            return
+        self.scores[key] = score
+        heapq.heappush(self.heap, (tuple(-s for s in score), key))
+        if len(self.heap) > 2 * len(self.scores) + 64:
+            self.heap = [(tuple(-s for s in score), key) for key, score in self.scores.items()]
+            heapq.heapify(self.heap)
+
+    def top(self, k):
+        """[(score, key)] of the k highest scores, highest first."""
+        heap, scores = self.heap, self.scores
+        result, kept, seen = [], [], set()
+        while heap and len(result) < k:
+            entry = heapq.heappop(heap)
+            negated, key = entry
+            score = tuple(-s for s in negated)
+            if key in seen or scores.get(key) != score:
+                continue    # stale, or the same score pushed twice
+            seen.add(key)
+            result.append((score, key))
+            kept.append(entry)
+        for entry in kept:
+            heapq.heappush(heap, entry)
+        return result
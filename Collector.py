@@ -0,0 +1,776 @@
+import time
+
+from ReadingsWriter import ReadingsWriter
+from ColumnStore import ColumnarWriter
+from RecordLog import RecordLogWriter
+from LiveFeed import open_feed
+from ServerLog import log
+from Profiler import PacketWindow
+from Metrics import (ServerMetrics, MetricsSnapshotter, DeviceMetricsWriter, device_metrics_row,
+                     DEVICE_SUB_BITS, WORST_DEVICES)
+from Histogram import Histogram
+from DeviceState import DeviceState
+from TimingWheel import TimingWheel
+from SequenceTracker import SequenceTracker, SEQ_MODULUS, IN_ORDER, GAP, DUPLICATE, LATE, next_seq
+from Protocol import (HEADER_SIZE, CHECKSUM_SIZES, MAX_PACKET_SIZE, INTEGRITY_MD5, INTEGRITY_NAMES, MSG_LABELS,
+                      unpack_header, unpack_values, pack_header, compute_checksum)
+
+READINGS_HEADER = [
+    "Sensor Type","ID","Seq","Timestamp","Arrival","Msg Type",
+    "Temperature","Humidity","Pressure","Packet Loss","Duplicate","ReadingCount"
+]
+
+GAPS_HEADER = ["Sensor Type","ID","First Seq","Last Seq","Missing","Filled","Arrival"]
+
+valueHistoryLimit = 5
+
+# csv = SensorsLogs.csv text rows, npy = typed column segments (ColumnStore.py),
+# log = fixed-size records in Readings.log for tail reads (RecordLog.py)
+STORAGE_SINKS = ("csv", "npy", "log")
+
+# how ESTIMATED rows are filled for lost packets
+FILL_STRATEGIES = ("mean", "ewma", "linear", "none")
+
+# heartbeat liveness, DeviceState.liveness (None until the first heartbeat)
+ALIVE = 0
+SUSPECT = 1
+DEAD = 2
+LIVENESS_LABELS = ("alive", "suspect", "dead")
+
+
+def msg_label(t):
+    return MSG_LABELS.get(t,str(t))
+
+
+class PacketContext:
+    """Everything the handlers learn about one datagram, passed down the pipeline."""
+
+    __slots__ = ("packet", "addr", "time_received", "data", "checksum",
+                 "version", "msg_type", "count", "sensor_type", "dev_id", "seq", "timestamp",
+                 "delay", "label", "values", "duplicate", "reply", "device")
+
+    def __init__(self, packet, addr, time_received):
+        self.packet = packet
+        self.addr = addr
+        self.time_received = time_received
+        self.values = ()
+        self.duplicate = False
+        self.reply = None
+
+
+# ---------------------- Handlers ----------------------
+class Handler:
+    """One pipeline stage.
+
+    handle() returns False to drop the packet, tick() runs every
+    tick_interval seconds independently of packet arrival. stage names the
+    handler in the --profile-stages timings.
+    """
+
+    tick_interval = None
+    stage = None
+
+    def handle(self, ctx):
+        return True
+
+    def tick(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class Parser(Handler):
+    stage = "parse"
+
+    def handle(self, ctx):
+        # zero-copy: header, payload and checksum are read straight out of one memoryview
+        view = ctx.packet if type(ctx.packet) is memoryview else memoryview(ctx.packet)
+        size = len(view)
+
+        (ctx.version, ctx.msg_type, ctx.count, ctx.sensor_type,
+         ctx.dev_id, ctx.seq, ctx.timestamp) = unpack_header(view)
+        ctx.delay = ctx.time_received - ctx.timestamp
+
+        # the version byte selects the integrity algorithm and so the trailer size
+        checksum_size = CHECKSUM_SIZES.get(ctx.version)
+        if checksum_size is None:
+            if log.enabled("NOISE", ctx.addr):
+                log.emit("NOISE", f"Unknown protocol version {ctx.version}")
+            return False
+        ctx.data = view[:size - checksum_size]
+        ctx.checksum = view[size - checksum_size:]
+
+        # -------- Noise Check --------
+        if ctx.count * 4 + HEADER_SIZE + checksum_size != size or size > MAX_PACKET_SIZE:
+            if log.enabled("NOISE", ctx.addr):
+                log.emit("NOISE", "Invalid payload size")
+            return False
+
+        ctx.label = msg_label(ctx.msg_type)
+        if ctx.msg_type == 1:
+            ctx.values = unpack_values(view, ctx.count)
+        return True
+
+
+class DeviceRegistry(Handler):
+    """INIT handshake and per-device state.
+
+    Assigns device IDs, negotiates the integrity algorithm, builds the reply
+    and attaches the DeviceState to every packet so later handlers never look
+    a device up again. After the INIT a device must keep to the algorithm it
+    was given; packets with any other, or one not accepted at all, are
+    dropped and counted (ServerMetrics.integrity_rejected).
+    """
+
+    stage = "registry"
+
+    def __init__(self, metrics, id_start=1, id_step=1, integrity=(INTEGRITY_MD5,)):
+        self.metrics = metrics
+        # accepted algorithms in preference order, the first one is the fallback
+        self.integrity = tuple(integrity)
+        self.devices = {}       # {dev_id: DeviceState}
+        self.device_map = {}    # {(addr, sensor_type): dev_id}
+        # workers hand out interleaved IDs (start=index+1, step=workers) so IDs stay globally unique
+        self.next_id = id_start
+        self.id_step = id_step
+
+    def handle(self, ctx):
+        if ctx.msg_type == 0:
+            self.handshake(ctx)
+            return True
+
+        device = self.devices.get(ctx.dev_id)
+        if device is None:
+            if ctx.version not in self.integrity:
+                return self.reject(ctx, "not accepted")
+            # never saw its INIT (e.g. the server restarted), track it anyway
+            device = self.devices[ctx.dev_id] = DeviceState(
+                ctx.dev_id, ctx.sensor_type, ctx.version)
+        elif ctx.version != device.integrity:
+            return self.reject(ctx, f"negotiated {INTEGRITY_NAMES[device.integrity]}")
+        ctx.device = device
+        return True
+
+    def reject(self, ctx, reason):
+        self.metrics.integrity_rejected += 1
+        if log.enabled("INTEGRITY", ctx.dev_id):
+            log.emit("INTEGRITY", f"ID={ctx.dev_id} seq={ctx.seq} sent "
+                                  f"{INTEGRITY_NAMES.get(ctx.version, ctx.version)}, {reason}: dropped")
+        return False
+
+    def handshake(self, ctx):
+        integrity = ctx.version if ctx.version in self.integrity else self.integrity[0]
+
+        key = (ctx.addr, ctx.sensor_type)
+        dev_id = self.device_map.get(key)
+        if dev_id is None:
+            dev_id = self.next_id
+            self.next_id += self.id_step
+            self.device_map[key] = dev_id
+            device = self.devices[dev_id] = DeviceState(
+                dev_id, ctx.sensor_type, integrity)
+            resume_seq = 0
+            log.log("HANDSHAKE", f"Type={ctx.sensor_type} assigned ID={dev_id} "
+                                 f"integrity={INTEGRITY_NAMES[integrity]}")
+        else:
+            device = self.devices[dev_id]
+            device.integrity = integrity
+            resume_seq = next_seq(device.seq.highest) if device.seq is not None else 1
+            ctx.seq = resume_seq
+            log.log("INFO", f"Device already registered (ID={dev_id})")
+
+        ctx.dev_id = dev_id
+        ctx.device = device
+        ctx.reply = pack_header(0, 0, ctx.sensor_type, dev_id, resume_seq, version=integrity)
+
+
+class MetricsHandler(Handler):
+    """Counts every packet that passed the noise check and publishes snapshots.
+
+    Delay and reporting interval go into the global histograms and, with
+    device_histograms, into the device's own ones as well. Received / bytes /
+    delay / interval are also added to the device's and its sensor type's
+    rows of the breakdown tables.
+    """
+
+    stage = "metrics"
+
+    def __init__(self, metrics, snapshotter, device_histograms=True):
+        self.metrics = metrics
+        self.snapshotter = snapshotter
+        self.device_histograms = device_histograms
+        self.tick_interval = snapshotter.interval
+
+    def handle(self, ctx):
+        metrics = self.metrics
+        size, delay = len(ctx.packet), ctx.delay
+        metrics.total_report_size += size
+        metrics.total_delay += delay
+        metrics.packets_received += 1
+        metrics.delay_hist.record(delay)
+
+        device = ctx.device
+        row = device.row
+        if row is None:
+            row = device.row = metrics.devices.row(device.dev_id)
+            device.type_row = metrics.types.row(device.sensor_type)
+        devices, types, type_row = metrics.devices, metrics.types, device.type_row
+        devices.received[row] += 1
+        devices.bytes[row] += size
+        devices.delay_sum[row] += delay
+        devices.touched.add(row)
+        types.received[type_row] += 1
+        types.bytes[type_row] += size
+        types.delay_sum[type_row] += delay
+
+        if self.device_histograms:
+            if device.delay_hist is None:
+                device.delay_hist = Histogram(DEVICE_SUB_BITS)
+                device.interval_hist = Histogram(DEVICE_SUB_BITS)
+                device.process_hist = Histogram(DEVICE_SUB_BITS)
+            device.delay_hist.record(ctx.delay)
+
+        # -------- Reporting Interval --------
+        if device.last_arrival is not None:
+            interval = ctx.time_received - device.last_arrival
+            metrics.reporting_interval_sum += interval
+            metrics.reporting_interval_count += 1
+            metrics.interval_hist.record(interval)
+            devices.interval_sum[row] += interval
+            devices.interval_count[row] += 1
+            types.interval_sum[type_row] += interval
+            types.interval_count[type_row] += 1
+            if device.interval_hist is not None:
+                device.interval_hist.record(interval)
+        device.last_arrival = ctx.time_received
+        return True
+
+    def tick(self):
+        self.metrics.log_suppressed = log.suppressed
+        self.snapshotter.maybe_publish()
+
+    def close(self):
+        self.metrics.log_suppressed = log.suppressed
+        self.snapshotter.publish(force=True)
+
+
+class SequenceHandler(Handler):
+    """Duplicate, loss and reorder detection; fills gaps with estimated rows.
+
+    At most max_fill_rows rows are synthesized per gap; a longer gap (sensor
+    restart, seq jump) is also recorded as one row of Gaps.csv.
+    """
+
+    stage = "sequence"
+
+    def __init__(self, metrics, values, storage, window=256, max_fill_rows=1024):
+        self.metrics = metrics
+        self.values = values
+        self.storage = storage
+        self.window = window
+        self.max_fill_rows = max_fill_rows
+
+    def handle(self, ctx):
+        seq = ctx.seq
+        tracker = ctx.device.seq
+        if tracker is None:
+            ctx.device.seq = SequenceTracker(seq, self.window)
+            return True
+
+        kind, n = tracker.classify(seq)
+        if kind == IN_ORDER:
+            return True
+
+        metrics = self.metrics
+        row, type_row = ctx.device.row, ctx.device.type_row
+        if kind == DUPLICATE:
+            ctx.duplicate = True
+            metrics.total_duplicates += 1
+            metrics.devices.duplicates[row] += 1
+            metrics.types.duplicates[type_row] += 1
+            if log.enabled("DUPLICATE", ctx.dev_id):
+                log.emit("DUPLICATE", f"ID={ctx.dev_id} seq={seq}")
+
+        # ======== MOVING AVERAGE LOSS SMOOTHING ========
+        elif kind == GAP:
+            metrics.losses += n
+            metrics.sequence_gap_count += 1
+            metrics.devices.lost[row] += n
+            metrics.devices.gaps[row] += 1
+            metrics.types.lost[type_row] += n
+            metrics.types.gaps[type_row] += 1
+            first_seq = (seq - n) % SEQ_MODULUS
+            estimates = self.values.estimate(ctx.device, n, ctx.values[0] if ctx.values else None,
+                                             self.max_fill_rows)
+            filled = len(estimates) if estimates else 0
+            if log.enabled("LOSS", ctx.dev_id):
+                if estimates is None:
+                    log.emit("LOSS", f"ID={ctx.dev_id} missing {n} packets, not filled")
+                elif filled == n:
+                    log.emit("LOSS", f"ID={ctx.dev_id} missing {n} packets, filled with {self.values.fill.upper()}")
+                else:
+                    log.emit("LOSS", f"ID={ctx.dev_id} missing {n} packets, {filled} filled with "
+                                     f"{self.values.fill.upper()}, {n - filled} skipped (--max-fill-rows)")
+            if filled:
+                self.storage.write_estimated(ctx, first_seq, estimates)
+            if n > self.max_fill_rows:
+                if log.enabled("GAP", ctx.dev_id):
+                    log.emit("GAP", f"ID={ctx.dev_id} seq {first_seq}..{(seq - 1) % SEQ_MODULUS} ({n} packets, "
+                                    f"{filled} filled) exceeds --max-fill-rows, recorded in {self.storage.gaps.path}")
+                self.storage.write_gap(ctx, first_seq, n, filled)
+
+        elif kind == LATE:
+            # this seq was counted as lost when the gap was seen
+            metrics.losses -= 1
+            metrics.late_arrivals += 1
+            metrics.devices.lost[row] -= 1
+            metrics.types.lost[type_row] -= 1
+            if log.enabled("LATE", ctx.dev_id):
+                log.emit("LATE", f"ID={ctx.dev_id} seq={seq} arrived {n} behind, loss recovered")
+
+        else:
+            metrics.stale_arrivals += 1
+            if log.enabled("STALE", ctx.dev_id):
+                log.emit("STALE", f"ID={ctx.dev_id} seq={seq} is {n} behind the window")
+        return True
+
+
+class ValueHistory(Handler):
+    """Keeps what the fill strategy needs of each device's real values and estimates lost ones.
+
+    mean   = mean of the last `window` values (DeviceState.history)
+    ewma   = exponentially weighted mean of every value seen (DeviceState.ewma only)
+    linear = straight line from the last good value to the value that ended the gap,
+             the mean of the history when the gap is not closed by a value
+    none   = losses are counted but no ESTIMATED rows are written, no values are kept
+    """
+
+    stage = "history"
+
+    def __init__(self, fill="mean", alpha=0.3, window=valueHistoryLimit):
+        if fill not in FILL_STRATEGIES:
+            raise ValueError(f"fill must be one of {FILL_STRATEGIES}")
+        self.fill = fill
+        self.alpha = alpha
+        self.window = window
+
+    def estimate(self, device, missing, next_value=None, limit=None):
+        """Values for the first min(missing, limit) lost readings, or None when nothing should be written."""
+        fill = self.fill
+        if fill == "none":
+            return None
+        rows = missing if limit is None else min(missing, limit)
+        if fill == "linear":
+            last = device.last_value()
+            if last is not None and next_value is not None:
+                # the slope still spans the whole gap when only its start is written
+                step = (next_value - last) / (missing + 1)
+                return [last + step * (i + 1) for i in range(rows)]
+        elif fill == "ewma" and device.ewma is not None:
+            return [device.ewma] * rows
+        return [device.moving_average()] * rows
+
+    def handle(self, ctx):
+        if ctx.msg_type != 1:
+            return True
+
+        fill = self.fill
+        if fill == "ewma":
+            ctx.device.add_ewma(ctx.values, self.alpha)
+        elif fill != "none":
+            ctx.device.add_values(ctx.values, self.window)
+
+        # at most one line per device per rate limit interval, nothing is formatted otherwise
+        if ctx.count == 1:
+            if log.enabled("DATA", ctx.dev_id):
+                log.emit("DATA", f"Single: Type={ctx.sensor_type} ID={ctx.dev_id} seq={ctx.seq} = {ctx.values[0]:.2f}")
+        elif log.enabled("BATCH", ctx.dev_id):
+            log.emit("BATCH", f"ID={ctx.dev_id} seq={ctx.seq} " + ",".join([f"{v:.2f}" for v in ctx.values]))
+        return True
+
+
+class HeartbeatMonitor(Handler):
+    """Heartbeat liveness: alive -> suspect after one timeout of silence -> dead after dead_after timeouts.
+
+    Every heartbeat re-arms the device's deadline in a TimingWheel, and tick()
+    only looks at the deadlines that expired, so the sweep costs nothing per
+    packet and nothing per silent-but-not-due device. Timeouts can differ per
+    sensor type (type_timeouts); the state counts are kept in ServerMetrics.
+    """
+
+    stage = "heartbeat"
+
+    def __init__(self, registry, metrics, timeout=20, type_timeouts=None, dead_after=3.0):
+        self.registry = registry
+        self.metrics = metrics
+        self.timeout = timeout
+        self.type_timeouts = dict(type_timeouts or {})
+        self.dead_after = dead_after
+        shortest = min([timeout] + list(self.type_timeouts.values()))
+        self.tick_interval = min(1.0, shortest / 4)
+        self.wheel = TimingWheel(self.tick_interval, now=time.monotonic())
+
+    def timeout_for(self, device):
+        return self.type_timeouts.get(device.sensor_type, self.timeout)
+
+    def handle(self, ctx):
+        if ctx.msg_type == 2:
+            device = ctx.device
+            if device.liveness != ALIVE:
+                if device.liveness is not None:
+                    log.log("HEARTBEAT", f"ID={device.dev_id} back after {LIVENESS_LABELS[device.liveness]}",
+                            device.dev_id)
+                self.set_liveness(device, ALIVE)
+            self.wheel.schedule(device.dev_id, time.monotonic() + self.timeout_for(device))
+            if log.enabled("HEARTBEAT", ctx.dev_id):
+                log.emit("HEARTBEAT", f"Device {ctx.dev_id} alive")
+        return True
+
+    def tick(self):
+        now = time.monotonic()
+        devices = self.registry.devices
+        for dev_id in self.wheel.advance(now):
+            device = devices.get(dev_id)
+            if device is None:
+                continue
+            timeout = self.timeout_for(device)
+            if device.liveness == ALIVE:
+                log.log("WARNING", f"ID={dev_id} missed heartbeat!")
+                self.set_liveness(device, SUSPECT)
+                # the deadline that just expired was one timeout after the last heartbeat
+                self.wheel.schedule(dev_id, now + timeout * (self.dead_after - 1))
+            elif device.liveness == SUSPECT:
+                log.log("WARNING", f"ID={dev_id} no heartbeat for {timeout * self.dead_after:g}s, marked dead")
+                self.set_liveness(device, DEAD)
+
+    def set_liveness(self, device, state):
+        metrics = self.metrics
+        if device.liveness is not None:
+            metrics.liveness_counts[device.liveness] -= 1
+        metrics.liveness_counts[state] += 1
+        device.liveness = state
+
+
+class DeviceMetricsHandler(Handler):
+    """Publishes the per-device histograms (DeviceMetrics.csv) every writer.interval seconds."""
+
+    stage = "device_metrics"
+
+    def __init__(self, registry, metrics, writer):
+        self.registry = registry
+        self.metrics = metrics
+        self.writer = writer
+        self.tick_interval = writer.interval
+        self.last_published_count = -1
+
+    def tick(self, force=False):
+        # nothing new since the last table -> don't rebuild it
+        if not force and self.metrics.packets_received == self.last_published_count:
+            return
+        self.last_published_count = self.metrics.packets_received
+        table = self.metrics.devices
+        rows = [row for row in (device_metrics_row(device, table) for device in self.registry.devices.values())
+                if row is not None]
+        self.writer.publish(rows)
+
+    def close(self):
+        self.tick(force=True)
+
+
+class Storage(Handler):
+    """Checksum verification, readings rows and Gaps.csv records.
+
+    writer is the SensorsLogs.csv ReadingsWriter (or None); every other sink
+    (ColumnarWriter, RecordLogWriter, LiveFeed) takes one row per value through
+    write_values() / write_estimated() and is flushed by maybe_flush().
+    """
+
+    stage = "storage"
+
+    def __init__(self, writer, metrics, gaps, sinks=()):
+        self.writer = writer
+        self.sinks = list(sinks)
+        self.metrics = metrics
+        self.gaps = gaps
+        self.tick_interval = gaps.flush_interval
+        self.stages = None      # StageProfiler with --profile-stages
+
+    def handle(self, ctx):
+        start = time.perf_counter()
+        valid = compute_checksum(ctx.data, ctx.version) == ctx.checksum
+        elapsed = time.perf_counter() - start
+        self.metrics.total_checksum_time += elapsed * 1e6
+        if self.stages is not None:
+            self.stages.record("checksum", elapsed)
+        self.metrics.total_checksum_bytes += len(ctx.checksum)
+
+        if not valid:
+            if log.enabled("CHECKSUM ERROR", ctx.dev_id):
+                log.emit("CHECKSUM ERROR", f"ID={ctx.dev_id} seq={ctx.seq}")
+            return True
+
+        for sink in self.sinks:
+            sink.write_values(ctx.sensor_type, ctx.dev_id, ctx.seq, ctx.msg_type,
+                              ctx.timestamp, ctx.time_received, ctx.values, ctx.duplicate)
+        if self.writer is None:
+            return True
+
+        sensor_type = ctx.sensor_type
+        cells = ["", "", ""]
+        if ctx.count > 1:
+            batch_values_str = ",".join([f"{v:.2f}" for v in ctx.values])
+            if sensor_type < 3: cells[sensor_type] = batch_values_str
+        elif ctx.count == 1 and ctx.msg_type == 1:
+            if sensor_type < 3: cells[sensor_type] = f"{ctx.values[0]:.2f}"
+
+        self.writer.write_row([
+            sensor_type, ctx.dev_id, ctx.seq, round(ctx.timestamp,3), round(time.time(),3),
+            ctx.label, cells[0], cells[1], cells[2], 0, ctx.duplicate, ctx.count
+        ])
+        return True
+
+    def write_estimated(self, ctx, first_seq, values):
+        for sink in self.sinks:
+            sink.write_estimated(ctx.sensor_type, ctx.dev_id, first_seq,
+                                 ctx.timestamp, ctx.time_received, values)
+        if self.writer is None:
+            return
+
+        sensor_type = ctx.sensor_type
+        est_arrival = round(time.time(),3)
+        self.writer.write_rows([
+            [
+                sensor_type, ctx.dev_id, (first_seq + i) % SEQ_MODULUS,
+                round(ctx.timestamp,3),
+                est_arrival,
+                "ESTIMATED",
+                f"{value:.2f}" if sensor_type == 0 else "",
+                f"{value:.2f}" if sensor_type == 1 else "",
+                f"{value:.2f}" if sensor_type == 2 else "",
+                1,     # loss flag
+                0,     # duplicate flag
+                1
+            ]
+            for i, value in enumerate(values)
+        ])
+
+    def write_gap(self, ctx, first_seq, missing, filled):
+        self.gaps.write_row([
+            ctx.sensor_type, ctx.dev_id, first_seq, (first_seq + missing - 1) % SEQ_MODULUS,
+            missing, filled, round(time.time(),3)
+        ])
+
+    def tick(self):
+        if self.writer is not None:
+            self.writer.maybe_flush()
+        for sink in self.sinks:
+            sink.maybe_flush()
+        self.gaps.maybe_flush()
+
+    def close(self):
+        try:
+            if self.writer is not None:
+                self.writer.close()
+            for sink in self.sinks:
+                sink.close()
+        finally:
+            self.gaps.close()
+
+
+# ---------------------- Collector ----------------------
+class Collector:
+    """Transport independent packet pipeline shared by the loop and asyncio servers."""
+
+    def __init__(self, readings_file="SensorsLogs.csv", metrics_file="Metrics.csv", gaps_file="Gaps.csv",
+                 log_file="Readings.log",
+                 flush_rows=256, flush_interval=1.0, durability="batched",
+                 metrics_interval=0.5, metrics_append=False, heartbeat_timeout=20,
+                 heartbeat_type_timeouts=None, heartbeat_dead_after=3.0,
+                 seq_window=256, history_window=valueHistoryLimit, fill="mean", ewma_alpha=0.3,
+                 max_fill_rows=1024, storage=("log",), storage_dir="Readings",
+                 segment_rows=1 << 20, segment_seconds=600.0, live_host="127.0.0.1", live_port=None,
+                 live_allow=("127.0.0.1",), device_metrics_file="DeviceMetrics.csv", device_metrics_interval=5.0, device_writer=None,
+                 type_metrics_file="TypeMetrics.csv", worst_devices=WORST_DEVICES,
+                 profile_stages=False, stages_file="StageProfile.csv",
+                 cprofile_file="Profile.pstats", cprofile_packets=0, cprofile_skip=0,
+                 overwrite=True, id_start=1, id_step=1, integrity=(INTEGRITY_MD5,),
+                 metrics=None, snapshotter=None, handlers=None):
+        self.metrics = metrics if metrics is not None else ServerMetrics()
+        self.metrics.worst_k = worst_devices
+
+        writer = None
+        sinks = []
+        if "csv" in storage:
+            writer = ReadingsWriter(
+                readings_file, header=READINGS_HEADER if overwrite else None,
+                flush_rows=flush_rows, flush_interval=flush_interval, durability=durability,
+                overwrite=overwrite
+            )
+            if overwrite:
+                print(f"[CSV] {readings_file} overwritten.", flush=True)
+        if "npy" in storage:
+            # segments are never overwritten, every run adds new ones
+            sinks.append(ColumnarWriter(
+                storage_dir, flush_rows=flush_rows, flush_interval=flush_interval, durability=durability,
+                segment_rows=segment_rows, segment_seconds=segment_seconds
+            ))
+        if "log" in storage:
+            sinks.append(RecordLogWriter(
+                log_file, flush_rows=flush_rows, flush_interval=flush_interval, durability=durability,
+                overwrite=overwrite
+            ))
+        # live push channel to the dashboard, disabled when live_port is None
+        self.live = open_feed(live_host, live_port, allow=live_allow) if live_port else None
+        if self.live is not None:
+            sinks.append(self.live)
+        gaps = ReadingsWriter(
+            gaps_file, header=GAPS_HEADER if overwrite else None,
+            flush_rows=flush_rows, flush_interval=flush_interval, durability=durability,
+            overwrite=overwrite
+        )
+
+        # snapshotter may be any object with interval / maybe_publish() / publish(force) / request_publish()
+        if snapshotter is None:
+            snapshotter = MetricsSnapshotter(self.metrics, metrics_file,
+                                             interval=metrics_interval, append=metrics_append, feed=self.live,
+                                             types_path=type_metrics_file, stages_path=stages_file)
+
+        self.registry = DeviceRegistry(self.metrics, id_start, id_step, integrity)
+        self.storage = Storage(writer, self.metrics, gaps, sinks)
+        self.values = ValueHistory(fill, ewma_alpha, history_window)
+        self.sequence = SequenceHandler(self.metrics, self.values, self.storage, seq_window, max_fill_rows)
+        self.heartbeats = HeartbeatMonitor(self.registry, self.metrics, heartbeat_timeout,
+                                           heartbeat_type_timeouts, heartbeat_dead_after)
+        # device_writer may be any object with interval / publish(rows); no per-device histograms without one
+        if device_writer is None and device_metrics_file and device_metrics_interval:
+            device_writer = DeviceMetricsWriter(device_metrics_file, device_metrics_interval)
+        self.metrics_handler = MetricsHandler(self.metrics, snapshotter, device_writer is not None)
+        self.device_metrics = (DeviceMetricsHandler(self.registry, self.metrics, device_writer)
+                               if device_writer is not None else None)
+
+        if handlers is None:
+            handlers = [Parser(), self.registry, self.metrics_handler, self.sequence,
+                        self.values, self.heartbeats, self.storage]
+            if self.device_metrics is not None:
+                handlers.append(self.device_metrics)
+            if self.live is not None:
+                # after Storage only for its tick: subscriptions and the record push
+                handlers.append(self.live)
+        self.handlers = handlers
+        self.tickers = [h for h in handlers if h.tick_interval]
+        self.tick_interval = min([h.tick_interval for h in self.tickers] or [1.0])
+        self.next_ticks = [0.0] * len(self.tickers)
+
+        # opt-in profiling: nothing is timed per stage, and no check runs per packet, unless enabled
+        if profile_stages:
+            stages = self.metrics.stages
+            self.stage_handlers = [(h, getattr(h, "stage", None) or type(h).__name__.lower())
+                                   for h in handlers]
+            stages.add([name for _, name in self.stage_handlers] + ["checksum", "logging"])
+            self.storage.stages = stages
+            log.stages = stages
+            self._run = self._run_stages
+        self.cprofile = PacketWindow(cprofile_file, cprofile_packets, cprofile_skip) if cprofile_packets else None
+
+    def handle_datagram(self, packet, addr):
+        """Run one datagram through the pipeline; returns the reply to send, if any."""
+        if self.cprofile is not None and not self.cprofile.step(1):
+            self.cprofile = None
+        start = time.perf_counter()
+        ctx = self._run(packet, addr, int(time.time()*1000))
+        if ctx is None:
+            return None
+        elapsed = time.perf_counter() - start
+        self.metrics.total_cpu_time += elapsed * 1000
+        self._record_process_time(ctx, elapsed)
+        return ctx.reply
+
+    def handle_batch(self, batch):
+        """Run a drained batch of (packet, addr); returns the (reply, addr) pairs to send.
+
+        All packets of one wakeup share the arrival timestamp and one CPU timer.
+        """
+        if self.cprofile is not None and not self.cprofile.step(len(batch)):
+            self.cprofile = None
+        start = time.perf_counter()
+        time_received = int(time.time()*1000)
+        replies = []
+        packet_start = start
+        for packet, addr in batch:
+            ctx = self._run(packet, addr, time_received)
+            if ctx is not None:
+                now = time.perf_counter()
+                self._record_process_time(ctx, now - packet_start)
+                packet_start = now
+                if ctx.reply is not None:
+                    replies.append((ctx.reply, addr))
+            else:
+                packet_start = time.perf_counter()
+        self.metrics.total_cpu_time += (time.perf_counter() - start) * 1000
+        return replies
+
+    def _record_process_time(self, ctx, elapsed):
+        us = int(elapsed * 1000000)
+        self.metrics.process_hist.record(us)
+        hist = ctx.device.process_hist
+        if hist is not None:
+            hist.record(us)
+
+    def _run(self, packet, addr, time_received):
+        ctx = PacketContext(packet, addr, time_received)
+        try:
+            for handler in self.handlers:
+                if not handler.handle(ctx):
+                    return None
+        except Exception as e:
+            log.error(e)
+            return None
+        return ctx
+
+    def _run_stages(self, packet, addr, time_received):
+        """_run() with every handler timed into ServerMetrics.stages (--profile-stages)."""
+        ctx = PacketContext(packet, addr, time_received)
+        record = self.metrics.stages.record
+        clock = time.perf_counter
+        try:
+            for handler, stage in self.stage_handlers:
+                start = clock()
+                keep = handler.handle(ctx)
+                record(stage, clock() - start)
+                if not keep:
+                    return None
+        except Exception as e:
+            log.error(e)
+            return None
+        return ctx
+
+    def tick(self):
+        """Runs every handler whose own tick_interval has elapsed (loop mode wakes at the shortest one).
+
+        A failing tick (full disk on a flush, os.replace refused) is logged and
+        the others still run, as in AsyncCollector.run_periodic.
+        """
+        now = time.monotonic()
+        next_ticks = self.next_ticks
+        for i, handler in enumerate(self.tickers):
+            if now >= next_ticks[i]:
+                next_ticks[i] = now + handler.tick_interval
+                try:
+                    handler.tick()
+                except Exception as e:
+                    log.error(e)
+
+    def request_metrics(self):
+        """On demand snapshot (SIGUSR1): written by the metrics handler's next tick, never from the signal handler."""
+        self.metrics_handler.snapshotter.request_publish()
+
+    def close(self):
+        if self.cprofile is not None:
+            self.cprofile.close()
+        log.stages = None
+        for handler in self.handlers:
+            try:
+                handler.close()
+            except Exception as e:
+                log.error(e)
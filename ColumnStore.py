@@ -0,0 +1,218 @@
+import ast, os, struct, sys, time
+from array import array
+
+from ServerLog import log
+
+# One row per reading value, one typed column per field. Every segment is a
+# directory of .npy files (one per column) written with the standard library,
+# so numpy.load(path, mmap_mode="r") and pandas can open them directly and
+# nothing has to be parsed from text.
+#
+#   name        array type   npy type
+COLUMNS = (
+    ("sensor_type", "B", "u1"),
+    ("dev_id",      "H", "u2"),
+    ("seq",         "H", "u2"),
+    ("index",       "B", "u1"),   # position of the value inside its batch
+    ("msg_type",    "B", "u1"),
+    ("timestamp",   "Q", "u8"),   # sensor timestamp, ms
+    ("arrival",     "Q", "u8"),   # server arrival, ms
+    ("value",       "f", "f4"),   # NaN for INIT / HEARTBEAT rows
+    ("loss",        "B", "u1"),   # 1 = ESTIMATED row
+    ("duplicate",   "B", "u1"),
+)
+COLUMN_NAMES = [name for name, _, _ in COLUMNS]
+
+SEGMENT_PREFIX = "segment-"
+NAN = float("nan")
+
+_ORDER = "<" if sys.byteorder == "little" else ">"
+_MAGIC = b"\x93NUMPY\x01\x00"
+_HEADER_SIZE = 128      # fixed, so the shape can be rewritten in place after every flush
+
+
+def _npy_header(kind, rows):
+    text = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (
+        ("|" if kind.endswith("1") else _ORDER) + kind, rows)
+    text = text.ljust(_HEADER_SIZE - len(_MAGIC) - 2 - 1) + "\n"
+    return _MAGIC + struct.pack("<H", len(text)) + text.encode("latin1")
+
+
+class ColumnarWriter:
+    """Appends readings as typed columns and rotates segments by rows or age.
+
+    Rows are buffered in array() columns and appended to the segment's .npy
+    files on the same size / time thresholds as ReadingsWriter; the header
+    shape is rewritten after the data, so a reader never sees rows that are
+    not on disk yet.
+    """
+
+    def __init__(self, directory="Readings", flush_rows=256, flush_interval=1.0, durability="batched",
+                 segment_rows=1 << 20, segment_seconds=600.0):
+        self.directory = directory
+        self.flush_rows = 1 if durability == "row" else max(1, flush_rows)
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.segment_rows = segment_rows
+        self.segment_seconds = segment_seconds
+        os.makedirs(directory, exist_ok=True)
+
+        self.columns = [array(code) for _, code, _ in COLUMNS]
+        self.pending = 0
+        self.segments = 0
+        self.files = None
+        self.segment_path = None
+        self.segment_written = 0
+        self.segment_started = 0.0
+        self.last_flush = time.monotonic()
+
+    def write_values(self, sensor_type, dev_id, seq, msg_type, timestamp, arrival, values, duplicate=False):
+        """One row per value, or a single NaN row for a packet without values."""
+        (c_type, c_dev, c_seq, c_index, c_msg, c_ts, c_arr, c_value, c_loss, c_dup) = self.columns
+        for i, v in enumerate(values or (NAN,)):
+            c_type.append(sensor_type)
+            c_dev.append(dev_id)
+            c_seq.append(seq)
+            c_index.append(i)
+            c_msg.append(msg_type)
+            c_ts.append(timestamp)
+            c_arr.append(arrival)
+            c_value.append(v)
+            c_loss.append(0)
+            c_dup.append(duplicate)
+        self.pending += len(values) if values else 1
+        self._check_thresholds()
+
+    def write_estimated(self, sensor_type, dev_id, first_seq, timestamp, arrival, values):
+        """One row per missing packet, seqs counted up from first_seq (mod 2^16)."""
+        n = len(values)
+        columns = self.columns
+        columns[0].extend([sensor_type] * n)
+        columns[1].extend([dev_id] * n)
+        columns[2].extend([(first_seq + i) & 0xFFFF for i in range(n)])
+        columns[3].extend(bytes(n))
+        columns[4].extend([1] * n)
+        columns[5].extend([timestamp] * n)
+        columns[6].extend([arrival] * n)
+        columns[7].extend(values)
+        columns[8].extend([1] * n)
+        columns[9].extend(bytes(n))
+        self.pending += n
+        self._check_thresholds()
+
+    def _check_thresholds(self):
+        if self.pending >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def maybe_flush(self):
+        """Flush on the time threshold only; called when the server is idle."""
+        if self.pending and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+        elif self.files is not None and time.time() - self.segment_started >= self.segment_seconds:
+            self._close_segment()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return
+        if self.files is not None and (self.segment_written >= self.segment_rows or
+                                       time.time() - self.segment_started >= self.segment_seconds):
+            self._close_segment()
+        if self.files is None:
+            self._open_segment()
+
+        # a flush never splits across segments, so a segment can exceed segment_rows by one flush
+        self.segment_written += self.pending
+        for f, column, (_, _, kind) in zip(self.files, self.columns, COLUMNS):
+            f.seek(0, os.SEEK_END)
+            f.write(column.tobytes())
+            f.seek(0)
+            f.write(_npy_header(kind, self.segment_written))
+            f.flush()
+            if self.durability == "fsync":
+                os.fsync(f.fileno())
+            del column[:]
+        self.pending = 0
+
+    def _open_segment(self):
+        # pid in the name keeps the segments of SO_REUSEPORT workers apart
+        self.segment_started = time.time()
+        name = f"{SEGMENT_PREFIX}{int(self.segment_started * 1000)}-{os.getpid()}-{self.segments:04d}"
+        self.segment_path = os.path.join(self.directory, name)
+        os.makedirs(self.segment_path)
+        self.files = []
+        for column_name, _, kind in COLUMNS:
+            f = open(os.path.join(self.segment_path, column_name + ".npy"), "w+b")
+            f.write(_npy_header(kind, 0))
+            self.files.append(f)
+        self.segment_written = 0
+        self.segments += 1
+        log.log("STORAGE", f"segment {self.segment_path} opened")
+
+    def _close_segment(self):
+        for f in self.files:
+            f.close()
+        self.files = None
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self.files is not None:
+                self._close_segment()
+
+
+# ---------------------- Reading ----------------------
+def list_segments(directory="Readings"):
+    """Segment directories, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    names = [n for n in os.listdir(directory) if n.startswith(SEGMENT_PREFIX)]
+    names.sort(key=lambda n: [int(part) for part in n[len(SEGMENT_PREFIX):].split("-")])
+    return [os.path.join(directory, n) for n in names]
+
+
+def read_column(path):
+    """One .npy column as an array(); only the rows its header already counts."""
+    with open(path, "rb") as f:
+        prefix = f.read(len(_MAGIC) + 2)
+        header = ast.literal_eval(f.read(struct.unpack("<H", prefix[-2:])[0]).decode("latin1"))
+        kind = header["descr"][1:]
+        rows = header["shape"][0]
+        code = next(code for _, code, k in COLUMNS if k == kind)
+        column = array(code)
+        column.frombytes(f.read(rows * column.itemsize))
+    if header["descr"][0] not in ("|", _ORDER):
+        column.byteswap()
+    return column
+
+
+def read_segment(path):
+    """{column name: array()} of one segment, cut to the shortest column while it is being written."""
+    columns = {name: read_column(os.path.join(path, name + ".npy")) for name in COLUMN_NAMES}
+    rows = min(len(c) for c in columns.values())
+    return {name: c[:rows] if len(c) > rows else c for name, c in columns.items()}
+
+
+def read_readings(directory="Readings"):
+    """Every segment of a directory concatenated into one {column name: array()}."""
+    result = {name: array(code) for name, code, _ in COLUMNS}
+    for path in list_segments(directory):
+        for name, column in read_segment(path).items():
+            result[name].extend(column)
+    return result
+
+
+def load_dataframe(directory="Readings"):
+    """Same as read_readings() as a pandas DataFrame (needs numpy + pandas)."""
+    import numpy as np
+    import pandas as pd
+
+    parts = []
+    for path in list_segments(directory):
+        columns = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r") for name in COLUMN_NAMES}
+        rows = min(len(c) for c in columns.values())
+        parts.append(pd.DataFrame({name: np.asarray(c[:rows]) for name, c in columns.items()}))
+    if not parts:
+        return pd.DataFrame(columns=COLUMN_NAMES)
+    return pd.concat(parts, ignore_index=True)
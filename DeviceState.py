@@ -0,0 +1,75 @@
+from array import array
+
+
+class DeviceState:
+    """Everything the collector keeps for one device, in a single compact record.
+
+    Replaces the separate recentPackets / value_history / last_arrival /
+    last_heartbeat dicts: one lookup per packet instead of one per dict, and
+    no per-instance __dict__. Only what the fill strategy needs is kept: the
+    mean and linear fills use a fixed array('d') ring buffer (raw doubles, no
+    float objects, no pop(0)), allocated on the first values, with a running
+    sum so the mean is O(1) whatever the window length; the ewma fill
+    keeps the average alone; none keeps nothing. The source address stays in
+    DeviceRegistry.device_map.
+    """
+
+    __slots__ = ("dev_id", "sensor_type", "integrity", "seq",
+                 "history", "history_len", "history_pos", "history_sum", "ewma",
+                 "last_arrival",
+                 "delay_hist", "interval_hist", "process_hist", "row", "type_row",
+                 "liveness")
+
+    def __init__(self, dev_id, sensor_type, integrity):
+        self.dev_id = dev_id
+        self.sensor_type = sensor_type
+        self.integrity = integrity
+        self.seq = None                             # SequenceTracker, created by the first packet
+        self.history = None                         # array('d') ring buffer, created by add_values()
+        self.history_len = 0                        # filled slots, never more than the window
+        self.history_pos = 0                        # next slot to overwrite
+        self.history_sum = 0.0                      # running sum of the filled slots
+        self.ewma = None
+        self.last_arrival = None                    # ms
+        # per-device Histograms, created by MetricsHandler on the first packet when enabled
+        self.delay_hist = None
+        self.interval_hist = None
+        self.process_hist = None
+        # rows of this device and of its sensor type in the metrics CounterTables
+        self.row = None
+        self.type_row = None
+        self.liveness = None                        # Collector.ALIVE / SUSPECT / DEAD once heartbeats start
+
+    def add_values(self, values, window):
+        history = self.history
+        if history is None:
+            history = self.history = array('d', bytes(8 * window))
+        size = len(history)
+        pos, n, total = self.history_pos, self.history_len, self.history_sum
+        for v in values:
+            if n == size:
+                total -= history[pos]
+            else:
+                n += 1
+            history[pos] = v
+            total += v
+            pos += 1
+            if pos == size:
+                pos = 0
+                # resync once per lap so float error can't pile up; amortised O(1)
+                total = sum(history)
+        self.history_pos, self.history_len, self.history_sum = pos, n, total
+
+    def add_ewma(self, values, alpha):
+        ewma = self.ewma
+        for v in values:
+            ewma = v if ewma is None else ewma + alpha * (v - ewma)
+        self.ewma = ewma
+
+    def moving_average(self):
+        return self.history_sum / self.history_len if self.history_len else 0
+
+    def last_value(self):
+        if not self.history_len:
+            return None
+        return self.history[self.history_pos - 1]
@@ -1,12 +1,18 @@
-import socket, struct, time, random, hashlib
+import socket, time, random
 import argparse
 
+from Protocol import MSG_INIT, MSG_DATA, MSG_HEARTBEAT, INTEGRITY_ALGORITHMS, encode_packet, unpack_header
+
 parser = argparse.ArgumentParser()
 parser.add_argument("--batch", type=int, default=3)
 parser.add_argument("--server-ip", default="127.0.0.1")
+parser.add_argument("--server-port", type=int, default=9999,
+                    help="collector port")
+parser.add_argument("--integrity", choices=INTEGRITY_ALGORITHMS, default="md5",
+                    help="integrity check requested at INIT (the server may fall back)")
 args = parser.parse_args()
 
-server_address = (args.server_ip, 9999)  #127.0.0.1 for non WSL runs, change if needed to the WSL IP -> set through the dashboard
+server_address = (args.server_ip, args.server_port)  #127.0.0.1 for non WSL runs, change if needed to the WSL IP -> set through the dashboard
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 sock.settimeout(3)
 
@@ -14,24 +20,19 @@ reporting_intervals = 1
 device_id = 0
 sensor_type = 1  # 1 = Humidity
 seq = 0
-
-HEADER_FORMAT = '!BBBBHHQ'  # version,msg_type,count,sensor,device,seq,timestamp
-VALUE_FORMAT  = '!f'
-
+integrity = INTEGRITY_ALGORITHMS[args.integrity]  # replaced by the server's answer at INIT
 
 MAX_BATCH = args.batch
 
 # msg type 0=>init, 1=>data, 2=>heartbeat
 
 def send_handshake():
-    global device_id, seq
+    global device_id, seq, integrity
 
     max_retries = 5
     retry_delay = 1  # seconds between retries
 
-    packet = struct.pack(HEADER_FORMAT, 1, 0, 0, sensor_type, device_id, seq, int(time.time()*1000))
-    checksum = hashlib.md5(packet).digest()
-    handshake_message = packet + checksum
+    handshake_message = encode_packet(MSG_INIT, sensor_type, device_id, seq, integrity=integrity)
 
     for attempt in range(1, max_retries + 1):
         try:
@@ -39,12 +40,11 @@ def send_handshake():
             sock.sendto(handshake_message, server_address)
 
             data, _ = sock.recvfrom(200)  # <-- may timeout
-            version, msg_type, _, sensor_type_recv, device_id_recv, last_seq, ts = struct.unpack(
-                HEADER_FORMAT, data[:struct.calcsize(HEADER_FORMAT)]
-            )
+            version, msg_type, _, sensor_type_recv, device_id_recv, last_seq, ts = unpack_header(data)
 
             device_id = device_id_recv
             seq = last_seq
+            integrity = version
 
             print(f"[INIT OK] Device={device_id}, Resume seq={seq}", flush=True)
             return  # success, exit function
@@ -62,31 +62,21 @@ def send_handshake():
 
 def send_single(value):
     global seq
-    seq += 1
-    packet = struct.pack(HEADER_FORMAT, 1, 1, 1, sensor_type, device_id, seq, int(time.time()*1000))
-    packet += struct.pack(VALUE_FORMAT, value)
-
-    checksum = hashlib.md5(packet).digest()
-    sock.sendto(packet + checksum, server_address)
+    seq = (seq + 1) & 0xFFFF  # 16-bit header field wraps around
+    sock.sendto(encode_packet(MSG_DATA, sensor_type, device_id, seq, (value,), integrity=integrity), server_address)
     print(f"[SINGLE] seq={seq}, humidity={value:.2f}%", flush=True)
 
 def send_heartbeat():
     global seq
-    seq += 1
-    packet = struct.pack(HEADER_FORMAT, 1, 2, 0, sensor_type, device_id, seq, int(time.time()*1000))
-    checksum = hashlib.md5(packet).digest()
-    sock.sendto(packet + checksum, server_address)
+    seq = (seq + 1) & 0xFFFF  # 16-bit header field wraps around
+    sock.sendto(encode_packet(MSG_HEARTBEAT, sensor_type, device_id, seq, integrity=integrity), server_address)
     print(f"[HEARTBEAT] seq={seq}", flush=True)
 
 def send_batch(values):
     global seq
-    seq += 1
+    seq = (seq + 1) & 0xFFFF  # 16-bit header field wraps around
     count = len(values)
-    header = struct.pack(HEADER_FORMAT, 1, 1, count, sensor_type, device_id, seq, int(time.time()*1000))
-    body = b''.join(struct.pack(VALUE_FORMAT, v) for v in values)
-    packet = header + body
-    checksum = hashlib.md5(packet).digest()
-    sock.sendto(packet + checksum, server_address)
+    sock.sendto(encode_packet(MSG_DATA, sensor_type, device_id, seq, values, integrity=integrity), server_address)
     print(f"[BATCH] seq={seq}, count={count}, values={[round(v,2) for v in values]}", flush=True)
 
 # ---------------- Start ----------------
@@ -0,0 +1,239 @@
+"""Userspace netem: a UDP relay between the sensors and Server.py that impairs the traffic.
+
+    python3 ImpairmentProxy.py --listen-port 9000 --loss 5 --seed 1
+    python3 ImpairmentProxy.py --listen-port 9000 --delay 100 --jitter 10
+    python3 TemperatureSensor.py --server-port 9000
+
+Needs no root and touches no interface, so several experiments can run side
+by side on one box, and a fixed --seed replays the same losses. Every sensor
+address gets its own upstream socket, so the server still sees one source
+address per sensor and its replies (INIT) find their way back. Impairments
+apply to both directions unless --direction says otherwise.
+
+Every forwarded datagram is put on a heap keyed by its departure time:
+  loss       dropped before anything else (percent)
+  duplicate  a second copy is scheduled as well (percent)
+  delay      fixed delay + uniform jitter (ms); like netem, jitter reorders
+  reorder    this share of packets skips the delay and overtakes the others (percent)
+  rate       bandwidth cap (kbit/s): a packet leaves after the one before it is serialised
+  limit      max datagrams waiting on the heap, later ones are dropped
+"""
+import argparse, heapq, random, selectors, socket, time
+
+RECV_SIZE = 65535
+
+
+class Impairment:
+    """Decides the fate of every datagram of one direction, from its own random generator."""
+
+    def __init__(self, rng, loss=0.0, duplicate=0.0, delay=0.0, jitter=0.0, reorder=0.0, rate_kbit=0.0):
+        self.rng = rng
+        self.loss = loss / 100
+        self.duplicate = duplicate / 100
+        self.delay = delay / 1000
+        self.jitter = jitter / 1000
+        self.reorder = reorder / 100
+        self.byte_time = 8 / (rate_kbit * 1000) if rate_kbit else 0.0
+        self.link_free = 0.0        # when the bandwidth-capped link is idle again
+
+    def departures(self, size, now):
+        """Departure times of the copies of one datagram ([] = lost)."""
+        rng = self.rng
+        if self.loss and rng.random() < self.loss:
+            return []
+        copies = 2 if self.duplicate and rng.random() < self.duplicate else 1
+        times = []
+        for _ in range(copies):
+            if self.reorder and rng.random() < self.reorder:
+                due = now
+            else:
+                due = now + self.delay
+                if self.jitter:
+                    due += rng.uniform(-self.jitter, self.jitter)
+                due = max(now, due)
+            if self.byte_time:
+                # serialised behind everything already on the link
+                self.link_free = max(self.link_free, due) + size * self.byte_time
+                due = self.link_free
+            times.append(due)
+        return times
+
+
+class ImpairmentProxy:
+    """Relay with a timer-heap scheduler; run() until stopped or duration elapsed."""
+
+    def __init__(self, listen, server, upstream, downstream, limit=10000, idle_timeout=300.0):
+        self.server = server
+        self.upstream = upstream            # sensors -> server impairment
+        self.downstream = downstream        # server -> sensors impairment
+        self.limit = limit
+        self.idle_timeout = idle_timeout
+
+        self.selector = selectors.DefaultSelector()
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.listener.bind(listen)
+        self.listener.setblocking(False)
+        self.selector.register(self.listener, selectors.EVENT_READ, None)
+
+        self.clients = {}       # {sensor addr: upstream socket}
+        self.last_seen = {}     # {sensor addr: time.monotonic()}
+        self.heap = []          # (departure, order, socket, data, destination)
+        self.order = 0
+        # received + duplicated == forwarded + lost + overflow + send_errors + unsent + what is still queued
+        self.stats = dict.fromkeys(("received", "forwarded", "lost", "duplicated", "overflow", "send_errors",
+                                    "unsent"), 0)
+
+    def upstream_socket(self, addr):
+        sock = self.clients.get(addr)
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            sock.connect(self.server)
+            self.clients[addr] = sock
+            self.selector.register(sock, selectors.EVENT_READ, addr)
+        self.last_seen[addr] = time.monotonic()
+        return sock
+
+    def schedule(self, impairment, sock, data, destination, now):
+        stats = self.stats
+        stats["received"] += 1
+        if len(self.heap) >= self.limit:
+            # tail drop before the impairment, so a full queue doesn't use up link time
+            stats["overflow"] += 1
+            return
+        departures = impairment.departures(len(data), now)
+        if not departures:
+            stats["lost"] += 1
+            return
+        stats["duplicated"] += len(departures) - 1
+        for due in departures:
+            self.order += 1     # FIFO among equal departure times
+            heapq.heappush(self.heap, (due, self.order, sock, data, destination))
+
+    def receive(self, events, now):
+        for key, _ in events:
+            sock, client = key.fileobj, key.data
+            while True:
+                try:
+                    if client is None:
+                        data, addr = sock.recvfrom(RECV_SIZE)
+                    else:
+                        data = sock.recv(RECV_SIZE)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    break       # ICMP unreachable while the server is down
+                if client is None:
+                    self.schedule(self.upstream, self.upstream_socket(addr), data, None, now)
+                else:
+                    self.schedule(self.downstream, self.listener, data, client, now)
+
+    def send_due(self, now):
+        heap, stats = self.heap, self.stats
+        while heap and heap[0][0] <= now:
+            _, _, sock, data, destination = heapq.heappop(heap)
+            try:
+                if destination is None:
+                    sock.send(data)
+                else:
+                    sock.sendto(data, destination)
+                stats["forwarded"] += 1
+            except OSError:
+                stats["send_errors"] += 1
+
+    def expire_clients(self, now):
+        for addr, seen in list(self.last_seen.items()):
+            if now - seen > self.idle_timeout:
+                sock = self.clients.pop(addr)
+                del self.last_seen[addr]
+                self.selector.unregister(sock)
+                sock.close()
+
+    def run(self, duration=None, report_every=1.0):
+        now = time.monotonic()
+        end = now + duration if duration else None
+        next_report = now + report_every if report_every else None
+        next_expire = now + 10
+        try:
+            while end is None or now < end:
+                timeout = 0.1 if not self.heap else max(0.0, self.heap[0][0] - now)
+                if end is not None:
+                    timeout = min(timeout, end - now)
+                events = self.selector.select(timeout)
+                now = time.monotonic()
+                if events:
+                    self.receive(events, now)
+                self.send_due(now)
+                if next_report is not None and now >= next_report:
+                    self.report()
+                    next_report = now + report_every
+                if now >= next_expire:
+                    self.expire_clients(now)
+                    next_expire = now + 10
+        finally:
+            # still waiting for their departure time when the run ended: never sent
+            self.stats["unsent"] += len(self.heap)
+            self.heap.clear()
+            self.report()
+
+    def report(self):
+        print("[PROXY] " + " ".join(f"{k}={v}" for k, v in self.stats.items()) +
+              f" queued={len(self.heap)} sensors={len(self.clients)}", flush=True)
+
+    def close(self):
+        for sock in self.clients.values():
+            sock.close()
+        self.listener.close()
+        self.selector.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listen-host", default="127.0.0.1")
+    parser.add_argument("--listen-port", type=int, default=9000, help="port the sensors send to")
+    parser.add_argument("--server-ip", default="127.0.0.1")
+    parser.add_argument("--server-port", type=int, default=9999)
+    parser.add_argument("--loss", type=float, default=0.0, help="percent of datagrams dropped")
+    parser.add_argument("--delay", type=float, default=0.0, help="one-way delay, ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform +/- jitter around --delay, ms")
+    parser.add_argument("--duplicate", type=float, default=0.0, help="percent of datagrams sent twice")
+    parser.add_argument("--reorder", type=float, default=0.0, help="percent of datagrams that skip the delay")
+    parser.add_argument("--rate", type=float, default=0.0, help="bandwidth cap, kbit/s (0 = none)")
+    parser.add_argument("--limit", type=int, default=10000, help="max datagrams waiting to be sent")
+    parser.add_argument("--direction", choices=("both", "up", "down"), default="both",
+                        help="up = sensors -> server only, down = server -> sensors only")
+    parser.add_argument("--seed", type=int, default=None, help="fixed seed: the same run drops the same packets")
+    parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    parser.add_argument("--report", type=float, default=1.0, help="seconds between stat lines, 0 = only at the end")
+    args = parser.parse_args(argv)
+
+    for name in ("loss", "duplicate", "reorder"):
+        if not 0 <= getattr(args, name) <= 100:
+            parser.error(f"--{name} is a percentage (0-100)")
+    if min(args.delay, args.jitter, args.rate) < 0 or args.limit < 1:
+        parser.error("--delay, --jitter and --rate must be 0 or more, --limit at least 1")
+
+    # one generator per direction, so replies interleaving differently can't shift the upstream draws
+    up_rng = random.Random(args.seed)
+    down_rng = random.Random(None if args.seed is None else args.seed + 1)
+    impaired = dict(loss=args.loss, duplicate=args.duplicate, delay=args.delay, jitter=args.jitter,
+                    reorder=args.reorder, rate_kbit=args.rate)
+    upstream = Impairment(up_rng, **(impaired if args.direction in ("both", "up") else {}))
+    downstream = Impairment(down_rng, **(impaired if args.direction in ("both", "down") else {}))
+
+    proxy = ImpairmentProxy((args.listen_host, args.listen_port), (args.server_ip, args.server_port),
+                            upstream, downstream, args.limit)
+    print(f"[PROXY] {args.listen_host}:{args.listen_port} -> {args.server_ip}:{args.server_port} "
+          f"loss={args.loss}% delay={args.delay}ms jitter={args.jitter}ms duplicate={args.duplicate}% "
+          f"reorder={args.reorder}% rate={args.rate or '-'}kbit/s direction={args.direction} seed={args.seed}",
+          flush=True)
+    try:
+        proxy.run(args.duration, args.report)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        proxy.close()
+
+
+if __name__ == "__main__":
+    main()
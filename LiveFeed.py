@@ -0,0 +1,226 @@
+import json, socket, time
+
+from RecordLog import RECORD, RECORD_SIZE, Record, FLAG_LOSS, FLAG_DUPLICATE, NAN
+from ServerLog import log
+
+# Local push channel from the server to the dashboard (UDP, default port 9998).
+#
+#   subscriber -> server : b"S" subscribe / renew the lease, b"U" unsubscribe
+#   server -> subscriber : b"M" + JSON metrics snapshot
+#                          b"R" + packed RecordLog records (new readings)
+#
+# A subscriber that stops renewing is dropped after LEASE_SECONDS, so a
+# closed dashboard never leaves the server sending into the void. Only
+# source addresses in the allow list may subscribe, at most MAX_SUBSCRIBERS
+# at a time: the feed carries every reading and a subscription costs one
+# 1-byte datagram, so an open feed would leak data and amplify spoofed traffic.
+
+FRAME_METRICS = b"M"
+FRAME_RECORDS = b"R"
+SUBSCRIBE = b"S"
+UNSUBSCRIBE = b"U"
+
+LEASE_SECONDS = 5.0
+RENEW_SECONDS = 2.0
+MAX_SUBSCRIBERS = 4
+DEFAULT_ALLOW = ("127.0.0.1",)
+FRAME_RECORDS_MAX = 40      # 1 + 40 * 32 bytes, stays below a 1500 byte MTU
+
+
+def open_feed(host="127.0.0.1", port=9998, records=True, allow=DEFAULT_ALLOW):
+    """LiveFeed on host:port, or None when the port is taken: the server then runs without it."""
+    try:
+        return LiveFeed(host, port, records, allow=allow)
+    except OSError as e:
+        log.log("WARNING", f"live feed disabled, cannot bind {host}:{port} ({e})")
+        return None
+
+
+class LiveFeed:
+    """Pushes metrics snapshots and new readings to subscribed dashboards.
+
+    Used as a storage sink (write_values / write_estimated) and as a pipeline
+    stage whose tick() accepts subscriptions and sends the buffered records,
+    so readings reach the dashboard within one tick instead of one file poll.
+    Nothing is buffered while nobody is subscribed.
+    """
+
+    tick_interval = 0.05
+    stage = "live"
+
+    def __init__(self, host="127.0.0.1", port=9998, records=True, max_pending=1024, allow=DEFAULT_ALLOW,
+                 max_subscribers=MAX_SUBSCRIBERS):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            self.sock.bind((host, port))
+        except OSError:
+            self.sock.close()
+            raise
+        self.sock.setblocking(False)
+        self.records = records
+        self.max_pending = max_pending
+        self.allow = frozenset(allow)       # source IPs that may subscribe
+        self.max_subscribers = max_subscribers
+        self.subscribers = {}       # {addr: lease expiry, time.monotonic()}
+        self.buffer = bytearray()
+        self.pending = 0
+        self.last_metrics = None
+        log.log("LIVE", f"feed on {host}:{port}, subscribers from {', '.join(sorted(self.allow))}")
+
+    # ---- pipeline stage ----
+    def handle(self, ctx):
+        return True
+
+    def tick(self):
+        self.poll()
+        self.flush()
+
+    # ---- storage sink ----
+    def write_values(self, sensor_type, dev_id, seq, msg_type, timestamp, arrival, values, duplicate=False):
+        if not self.subscribers or not self.records:
+            return
+        pack = RECORD.pack
+        flags = FLAG_DUPLICATE if duplicate else 0
+        count = len(values)
+        buffer = self.buffer
+        for i, v in enumerate(values or (NAN,)):
+            buffer += pack(sensor_type, msg_type, i, count, flags, dev_id, seq, timestamp, arrival, v)
+        self.pending += count or 1
+        self._trim()
+
+    def write_estimated(self, sensor_type, dev_id, first_seq, timestamp, arrival, values):
+        if not self.subscribers or not self.records:
+            return
+        pack = RECORD.pack
+        buffer = self.buffer
+        # only the newest max_pending would survive _trim() anyway
+        skip = max(0, len(values) - self.max_pending)
+        for i in range(skip, len(values)):
+            buffer += pack(sensor_type, 1, 0, 1, FLAG_LOSS, dev_id, (first_seq + i) & 0xFFFF,
+                           timestamp, arrival, values[i])
+        self.pending += len(values) - skip
+        self._trim()
+
+    def _trim(self):
+        # a dashboard only shows the latest readings: drop the oldest when it can't keep up
+        excess = self.pending - self.max_pending
+        if excess > 0:
+            del self.buffer[:excess * RECORD_SIZE]
+            self.pending -= excess
+
+    def maybe_flush(self):
+        self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        data = self.buffer
+        step = FRAME_RECORDS_MAX * RECORD_SIZE
+        for start in range(0, len(data), step):
+            self._send(FRAME_RECORDS + data[start:start + step])
+        del self.buffer[:]
+        self.pending = 0
+
+    # ---- metrics ----
+    def publish_metrics(self, data):
+        self.last_metrics = FRAME_METRICS + json.dumps(data, separators=(",", ":")).encode()
+        self._send(self.last_metrics)
+
+    # ---- subscriptions ----
+    def poll(self):
+        if self.sock is None:
+            return
+        now = time.monotonic()
+        while True:
+            try:
+                message, addr = self.sock.recvfrom(16)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                continue
+            if message == SUBSCRIBE:
+                if addr not in self.subscribers:
+                    if addr[0] not in self.allow:
+                        log.log("LIVE", f"subscription from {addr[0]} refused, not in --live-allow", "refused")
+                        continue
+                    if len(self.subscribers) >= self.max_subscribers:
+                        log.log("LIVE", f"subscription from {addr[0]}:{addr[1]} refused, "
+                                        f"{self.max_subscribers} subscribers already", "refused")
+                        continue
+                    log.log("LIVE", f"subscriber {addr[0]}:{addr[1]}", addr)
+                    if self.last_metrics is not None:
+                        self._send_to(self.last_metrics, addr)
+                self.subscribers[addr] = now + LEASE_SECONDS
+            elif message == UNSUBSCRIBE:
+                self.subscribers.pop(addr, None)
+
+        for addr, expiry in list(self.subscribers.items()):
+            if expiry < now:
+                del self.subscribers[addr]
+
+    def _send(self, frame):
+        for addr in list(self.subscribers):
+            self._send_to(frame, addr)
+
+    def _send_to(self, frame, addr):
+        try:
+            self.sock.sendto(frame, addr)
+        except BlockingIOError:
+            pass        # socket buffer full, this frame is skipped
+        except OSError:
+            self.subscribers.pop(addr, None)
+
+    def close(self):
+        if self.sock is None:
+            return
+        self.sock.close()
+        self.sock = None
+
+
+class LiveFeedClient:
+    """Subscriber side: non-blocking, call poll() from the UI loop."""
+
+    def __init__(self, host="127.0.0.1", port=9998):
+        self.addr = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.last_renew = 0.0
+        self.last_frame = 0.0
+
+    def connected(self, within=LEASE_SECONDS):
+        """True when a frame arrived in the last `within` seconds."""
+        return time.monotonic() - self.last_frame < within
+
+    def poll(self):
+        """(metrics dict or None, [Record, ...]) received since the last call; renews the lease."""
+        now = time.monotonic()
+        if now - self.last_renew >= RENEW_SECONDS:
+            self.last_renew = now
+            try:
+                self.sock.sendto(SUBSCRIBE, self.addr)
+            except OSError:
+                pass
+
+        metrics, records = None, []
+        while True:
+            try:
+                frame = self.sock.recv(65535)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                # ICMP port unreachable while the server is down
+                break
+            self.last_frame = now
+            kind, payload = frame[:1], frame[1:]
+            if kind == FRAME_METRICS:
+                metrics = json.loads(payload)
+            elif kind == FRAME_RECORDS:
+                records.extend(Record._make(fields) for fields in RECORD.iter_unpack(payload))
+        return metrics, records
+
+    def close(self):
+        try:
+            self.sock.sendto(UNSUBSCRIBE, self.addr)
+        except OSError:
+            pass
+        self.sock.close()
@@ -0,0 +1,277 @@
+"""Drives many virtual sensors from one process to find the collector's saturation point.
+
+    python3 LoadGenerator.py --devices 2000 --rate 20000 --duration 30
+
+Every virtual device owns one socket, bound to its own source port, and
+sends its INIT and all its data from it: the server keys devices by address
++ sensor type, and with --workers the kernel picks the worker from the
+source address, so a device must never change address. Packets are the ones the sensor scripts send (single,
+batch, heartbeat), built with Protocol.encode_packet. Pacing is open loop:
+packet k is due at start + k / rate whatever the server does, a late
+generator catches up instead of slowing down, and the lag is reported.
+"""
+import argparse, json, random, resource, selectors, socket, sys, time
+
+from Protocol import (MSG_INIT, MSG_DATA, MSG_HEARTBEAT, INTEGRITY_ALGORITHMS, MAX_VALUES,
+                      encode_packet, unpack_header)
+
+# value range per sensor type, same as the sensor scripts
+VALUE_RANGES = {0: (20.0, 30.0), 1: (40.0, 60.0), 2: (950.0, 1050.0)}
+
+HANDSHAKE_WAVE = 256        # INITs in flight at once
+HANDSHAKE_TIMEOUT = 1.0
+HANDSHAKE_RETRIES = 3
+
+
+class VirtualDevice:
+    __slots__ = ("sensor_type", "dev_id", "seq", "integrity", "low", "high", "sock")
+
+    def __init__(self, sensor_type, integrity):
+        self.sensor_type = sensor_type
+        self.dev_id = 0
+        self.seq = 0
+        self.integrity = integrity
+        self.low, self.high = VALUE_RANGES.get(sensor_type, (0.0, 100.0))
+        self.sock = None        # bound by handshake(), used for every packet of the device
+
+
+def parse_mix(text):
+    """"0:1,1:1,2:2" -> [(sensor type, weight)]."""
+    mix = []
+    for item in text.split(","):
+        sensor_type, _, weight = item.partition(":")
+        mix.append((int(sensor_type), float(weight or 1)))
+    if not mix or any(w < 0 for _, w in mix) or not sum(w for _, w in mix):
+        raise ValueError("mix needs at least one positive weight")
+    return mix
+
+
+# ---------------------- Handshake ----------------------
+def _bind_next(sock, host, port_iter):
+    for port in port_iter:
+        try:
+            sock.bind((host, port))
+            return True
+        except OSError:
+            continue
+    return False
+
+
+def handshake(devices, server, bind_host="0.0.0.0", base_port=20000):
+    """INIT for every device, HANDSHAKE_WAVE at a time, each from a source port never used before.
+
+    A device that gets an ID keeps its socket (device.sock) for its data, so
+    the server sees one stable address per device; release it with
+    close_devices(). Returns the devices that got an ID.
+    """
+    ports = iter(range(base_port, 65536))
+    selector = selectors.DefaultSelector()
+    ready = []
+    pending = list(devices)
+    while pending:
+        wave, pending = pending[:HANDSHAKE_WAVE], pending[HANDSHAKE_WAVE:]
+        inflight = {}
+        for device in wave:
+            try:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            except OSError as e:
+                raise SystemExit(f"[LOAD] cannot open a socket per device ({e}), raise ulimit -n")
+            if not _bind_next(sock, bind_host, ports):
+                sock.close()
+                raise SystemExit("[LOAD] ran out of source ports for the handshakes")
+            sock.setblocking(False)
+            inflight[sock] = [device, 0, 0.0]
+            selector.register(sock, selectors.EVENT_READ)
+
+        while inflight:
+            now = time.monotonic()
+            for sock, state in list(inflight.items()):
+                device, attempts, sent_at = state
+                if now - sent_at < HANDSHAKE_TIMEOUT:
+                    continue
+                if attempts == HANDSHAKE_RETRIES:
+                    print(f"[LOAD] no INIT reply for a type {device.sensor_type} device, dropped", flush=True)
+                    selector.unregister(sock)
+                    sock.close()
+                    del inflight[sock]
+                    continue
+                try:
+                    sock.sendto(encode_packet(MSG_INIT, device.sensor_type, 0, 0, integrity=device.integrity),
+                                server)
+                except OSError:
+                    pass
+                state[1], state[2] = attempts + 1, now
+
+            for key, _ in selector.select(timeout=0.05):
+                sock = key.fileobj
+                try:
+                    data = sock.recv(200)
+                except OSError:
+                    continue
+                device = inflight.pop(sock)[0]
+                version, _, _, _, dev_id, resume_seq, _ = unpack_header(data)
+                device.dev_id, device.seq, device.integrity = dev_id, resume_seq, version
+                device.sock = sock
+                ready.append(device)
+                selector.unregister(sock)
+    selector.close()
+    return ready
+
+
+def close_devices(devices):
+    for device in devices:
+        if device.sock is not None:
+            device.sock.close()
+            device.sock = None
+
+
+def raise_fd_limit(needed):
+    """Lifts the soft open-file limit towards the hard one when one socket per device would not fit."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+# ---------------------- Traffic ----------------------
+def next_packet(device, rng, batch_max, batch_every, heartbeat_every, batch_min=2):
+    """Same schedule as the sensor scripts: heartbeat every Nth seq, batch every Mth, single otherwise."""
+    seq = (device.seq + 1) & 0xFFFF
+    device.seq = seq
+    if heartbeat_every and seq % heartbeat_every == 0:
+        return encode_packet(MSG_HEARTBEAT, device.sensor_type, device.dev_id, seq, integrity=device.integrity)
+    if batch_every and batch_max > 1 and seq % batch_every == 0:
+        values = [rng.uniform(device.low, device.high) for _ in range(rng.randint(batch_min, batch_max))]
+    else:
+        values = (rng.uniform(device.low, device.high),)
+    return encode_packet(MSG_DATA, device.sensor_type, device.dev_id, seq, values, integrity=device.integrity)
+
+
+def run(devices, server, rate, duration, burst=1, batch_max=3, batch_every=7, heartbeat_every=5,
+        seed=None, progress=True, batch_min=2):
+    """Sends for `duration` seconds at `rate` packets/s in bursts from the devices' own sockets.
+
+    Returns the summary dict; the sockets stay open (close_devices()).
+    """
+    rng = random.Random(seed)
+    sent = send_errors = values_sent = 0
+    max_lag = 0.0
+    burst_period = burst / rate
+    n_devices = len(devices)
+    index = 0
+    start = time.perf_counter()
+    end = start + duration
+    next_report = start + 1.0
+    last_sent = 0
+    bursts = 0
+    while True:
+        due = start + bursts * burst_period
+        if due >= end:
+            break
+        now = time.perf_counter()
+        if now >= end:
+            break       # open loop: what could not be sent in time is not sent late
+        if due > now:
+            time.sleep(due - now)
+        else:
+            max_lag = max(max_lag, now - due)
+        for _ in range(burst):
+            device = devices[index % n_devices]
+            packet = next_packet(device, rng, batch_max, batch_every, heartbeat_every, batch_min)
+            try:
+                device.sock.sendto(packet, server)
+                sent += 1
+                values_sent += packet[2]
+            except (BlockingIOError, InterruptedError):
+                send_errors += 1    # local socket buffer full: the generator itself is saturated
+            except OSError:
+                send_errors += 1
+            index += 1
+        bursts += 1
+
+        if progress and now >= next_report:
+            print(f"[LOAD] {sent - last_sent} pkt/s, lag {max_lag * 1000:.1f} ms, send errors {send_errors}",
+                  flush=True)
+            last_sent = sent
+            next_report += 1.0
+
+    elapsed = time.perf_counter() - start
+    return {
+        "devices": n_devices,
+        "offered_rate": rate,
+        "duration_s": round(elapsed, 3),
+        "packets_sent": sent,
+        "values_sent": values_sent,
+        "achieved_rate": round(sent / elapsed, 1) if elapsed else 0,
+        "send_errors": send_errors,
+        "max_lag_ms": round(max_lag * 1000, 3),
+    }
+
+
+def build_devices(count, mix, integrity, rng):
+    types = [t for t, _ in mix]
+    weights = [w for _, w in mix]
+    return [VirtualDevice(t, integrity) for t in rng.choices(types, weights, k=count)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--server-ip", default="127.0.0.1")
+    parser.add_argument("--server-port", type=int, default=9999)
+    parser.add_argument("--devices", type=int, default=1000, help="virtual devices")
+    parser.add_argument("--rate", type=float, default=1000, help="aggregate packets per second (offered load)")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of traffic after the handshakes")
+    parser.add_argument("--burst", type=int, default=1,
+                        help="packets sent back to back per burst; bursts are spaced to keep --rate")
+    parser.add_argument("--mix", default="0:1,1:1,2:1", help="sensor type weights, TYPE:WEIGHT,...")
+    parser.add_argument("--batch", type=int, default=3, help="max values per batch packet")
+    parser.add_argument("--batch-min", type=int, default=2, help="min values per batch packet")
+    parser.add_argument("--batch-every", type=int, default=7, help="every Nth seq of a device is a batch, 0 = never")
+    parser.add_argument("--heartbeat-every", type=int, default=5,
+                        help="every Nth seq of a device is a heartbeat, 0 = never")
+    parser.add_argument("--base-port", type=int, default=20000, help="first source port tried for the handshakes")
+    parser.add_argument("--integrity", choices=INTEGRITY_ALGORITHMS, default="md5")
+    parser.add_argument("--seed", type=int, default=None, help="fixed seed for the device mix and values")
+    parser.add_argument("--json", action="store_true", help="print the summary as one JSON line")
+    args = parser.parse_args(argv)
+
+    if args.devices < 1 or args.rate <= 0 or args.duration <= 0 or args.burst < 1:
+        parser.error("--devices, --rate, --duration and --burst must be positive")
+    if not 1 <= args.batch <= MAX_VALUES:
+        parser.error(f"--batch must be between 1 and {MAX_VALUES}")
+    if not 1 <= args.batch_min <= args.batch:
+        parser.error("--batch-min must be between 1 and --batch")
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(f"--mix: {e}")
+
+    server = (args.server_ip, args.server_port)
+    rng = random.Random(args.seed)
+    devices = build_devices(args.devices, mix, INTEGRITY_ALGORITHMS[args.integrity], rng)
+
+    raise_fd_limit(args.devices + 64)
+    started = time.monotonic()
+    devices = handshake(devices, server, base_port=args.base_port)
+    if not devices:
+        raise SystemExit("[LOAD] no device completed the handshake, is the server running?")
+    print(f"[LOAD] {len(devices)} devices registered in {time.monotonic() - started:.2f}s", flush=True)
+
+    try:
+        summary = run(devices, server, args.rate, args.duration, args.burst, args.batch,
+                      args.batch_every, args.heartbeat_every, args.seed, progress=not args.json,
+                      batch_min=args.batch_min)
+    finally:
+        close_devices(devices)
+    if args.json:
+        print(json.dumps(summary), flush=True)
+    else:
+        print("[LOAD] " + ", ".join(f"{k}={v}" for k, v in summary.items()), flush=True)
+    return summary
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(0)
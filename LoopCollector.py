@@ -0,0 +1,75 @@
+import socket, time
+
+from Protocol import MAX_PACKET_SIZE
+from BatchReceiver import BatchReceiver
+from ServerLog import log
+
+
+def open_socket(host, port, reuse_port=False):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if reuse_port:
+        # every worker binds the same port, the kernel spreads flows across them
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    return sock
+
+
+# ========================= BLOCKING LOOP =========================
+def run_loop(collector, host="0.0.0.0", port=9999, reuse_port=False, label="Server", recv_batch=1):
+    if recv_batch > 1:
+        return run_batched_loop(collector, host, port, reuse_port, label, recv_batch)
+
+    sock = open_socket(host, port, reuse_port)
+    # wake up while idle so buffered rows, metrics and heartbeat checks still run
+    sock.settimeout(collector.tick_interval)
+    print(f"{label} started...", flush=True)
+
+    next_tick = time.monotonic() + collector.tick_interval
+    try:
+        while True:
+            try:
+                packet, addr = sock.recvfrom(MAX_PACKET_SIZE)
+            except socket.timeout:
+                packet = None
+            except OSError as e:
+                log.error(e)
+                continue
+
+            if packet is not None:
+                reply = collector.handle_datagram(packet, addr)
+                if reply is not None:
+                    try:
+                        sock.sendto(reply, addr)
+                    except OSError as e:
+                        log.error(e)
+
+            now = time.monotonic()
+            if now >= next_tick:
+                collector.tick()
+                next_tick = now + collector.tick_interval
+    finally:
+        sock.close()
+
+
+def run_batched_loop(collector, host, port, reuse_port, label, recv_batch):
+    sock = open_socket(host, port, reuse_port)
+    receiver = BatchReceiver(sock, recv_batch, collector.metrics)
+    print(f"{label} started... (batched receive, up to {recv_batch} per wakeup)", flush=True)
+
+    next_tick = time.monotonic() + collector.tick_interval
+    try:
+        while True:
+            batch = receiver.receive(max(0.0, next_tick - time.monotonic()))
+            if batch:
+                for reply, addr in collector.handle_batch(batch):
+                    try:
+                        sock.sendto(reply, addr)
+                    except OSError as e:
+                        log.error(e)
+
+            now = time.monotonic()
+            if now >= next_tick:
+                collector.tick()
+                next_tick = now + collector.tick_interval
+    finally:
+        sock.close()
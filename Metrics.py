@@ -0,0 +1,297 @@
+import csv, os, time
+
+from Histogram import Histogram, PERCENTILES
+from Breakdown import CounterTable, BREAKDOWN_FIELDS
+from Profiler import StageProfiler, STAGE_FIELDS
+
+METRIC_FIELDS = [
+    "bytes_per_report", "packets_received", "duplicate_rate",
+    "sequence_gap_count", "cpu_ms_per_report",
+    "packet_loss_percent", "avg_reporting_interval_in_ms", "avg_delay_in_ms",
+    "avg_recv_batch", "recv_batch_distribution",
+    "integrity_bytes_per_report", "checksum_us_per_report", "integrity_rejected",
+    "late_arrivals", "stale_arrivals",
+    "log_lines_suppressed", "worst_devices", "loss_by_type",
+    "devices_alive", "devices_suspect", "devices_dead", "stage_profile"
+]
+
+# tail of the distributions, from the log-bucketed histograms (Histogram.py)
+PERCENTILE_LABELS = ("p50", "p90", "p99", "p999")
+HISTOGRAM_FIELDS = (("delay", "ms"), ("interval", "ms"), ("process", "us"))
+METRIC_FIELDS += [f"{name}_{p}_{unit}" for name, unit in HISTOGRAM_FIELDS for p in PERCENTILE_LABELS]
+
+# one row per device in DeviceMetrics.csv, one per sensor type in TypeMetrics.csv
+DEVICE_METRIC_FIELDS = ["Sensor Type", "ID"] + BREAKDOWN_FIELDS + [
+    f"{name}_{p}_{unit}" for name, unit in HISTOGRAM_FIELDS for p in PERCENTILE_LABELS + ("max",)
+]
+TYPE_METRIC_FIELDS = ["Sensor Type"] + BREAKDOWN_FIELDS
+
+# devices listed in worst_devices (highest loss rate first)
+WORST_DEVICES = 5
+
+# global histograms: 1.6 % worst-case error; per device: 6.3 %, a quarter of the buckets
+GLOBAL_SUB_BITS = 7
+DEVICE_SUB_BITS = 5
+
+# receive batch size buckets: 1, 2-3, 4-7, 8-15, 16-31, 32-63, 64-127, 128+
+RECV_BATCH_BUCKETS = 8
+
+
+def batch_bucket(size):
+    return min(size.bit_length() - 1, RECV_BATCH_BUCKETS - 1)
+
+
+def batch_bucket_label(index):
+    low = 1 << index
+    if index == RECV_BATCH_BUCKETS - 1:
+        return f"{low}+"
+    return str(low) if low == 1 else f"{low}-{2 * low - 1}"
+
+
+class ServerMetrics:
+    """Raw in-memory counters; derived values are only computed on snapshot."""
+
+    __slots__ = ("packets_received", "losses", "total_report_size", "total_duplicates",
+                 "sequence_gap_count", "total_cpu_time", "total_delay",
+                 "reporting_interval_sum", "reporting_interval_count",
+                 "recv_wakeups", "recv_packets", "recv_batch_buckets",
+                 "total_checksum_bytes", "total_checksum_time", "integrity_rejected",
+                 "late_arrivals", "stale_arrivals", "log_suppressed",
+                 "delay_hist", "interval_hist", "process_hist",
+                 "types", "worst", "devices", "worst_k", "liveness_counts", "stages")
+
+    # stay in the process that owns the devices: a worker ships its top-k rows ("worst") instead
+    LOCAL = ("devices", "worst_k")
+
+    def __init__(self):
+        self.packets_received = 0
+        self.losses = 0
+        self.total_report_size = 0
+        self.total_duplicates = 0
+        self.sequence_gap_count = 0
+        self.total_cpu_time = 0      # ms
+        self.total_delay = 0         # ms
+        self.reporting_interval_sum = 0
+        self.reporting_interval_count = 0
+        # batched receive path only (BatchReceiver)
+        self.recv_wakeups = 0
+        self.recv_packets = 0
+        self.recv_batch_buckets = [0] * RECV_BATCH_BUCKETS
+        # negotiated integrity check: trailer bytes and verification time (us)
+        self.total_checksum_bytes = 0
+        self.total_checksum_time = 0
+        # packets dropped for using an algorithm other than the negotiated / accepted ones
+        self.integrity_rejected = 0
+        # reordering: late = recovered losses, stale = behind the sequence window
+        self.late_arrivals = 0
+        self.stale_arrivals = 0
+        # console lines filtered by level / rate limit or dropped on a full log queue
+        self.log_suppressed = 0
+        # one-way delay (ms), inter-arrival time per device (ms), pipeline time per packet (us)
+        self.delay_hist = Histogram(GLOBAL_SUB_BITS)
+        self.interval_hist = Histogram(GLOBAL_SUB_BITS)
+        self.process_hist = Histogram(GLOBAL_SUB_BITS)
+        # breakdown by sensor type and by dev_id (Breakdown.py), rows attached to DeviceState
+        self.types = CounterTable()
+        self.devices = CounterTable()
+        self.worst = []             # merged [(loss %, lost, dev_id)] of the workers' worst devices
+        self.worst_k = WORST_DEVICES
+        # devices per heartbeat state: alive, suspect, dead (Collector.HeartbeatMonitor)
+        self.liveness_counts = [0, 0, 0]
+        # per pipeline stage timings, only filled with --profile-stages (Profiler.py)
+        self.stages = StageProfiler()
+
+    def shipped(self):
+        return [name for name in self.__slots__ if name not in self.LOCAL]
+
+    def counters(self):
+        """Plain tuple of the raw counters, cheap to ship between processes."""
+        self.worst = self.devices.worst(self.worst_k)
+        return tuple(
+            list(value) if isinstance(value, list)
+            else value.state() if isinstance(value, (Histogram, CounterTable, StageProfiler)) else value
+            for value in (getattr(self, name) for name in self.shipped())
+        )
+
+    def load_sum(self, counter_sets):
+        """Replace the counters with the sum of several counters() tuples."""
+        fresh = ServerMetrics()
+        names = self.shipped()
+        for counters in counter_sets:
+            for name, value in zip(names, counters):
+                current = getattr(fresh, name)
+                if name == "worst":
+                    current.extend(value)
+                elif isinstance(current, list):
+                    for i, v in enumerate(value):
+                        current[i] += v
+                elif isinstance(current, (Histogram, CounterTable, StageProfiler)):
+                    current.merge_state(value)
+                else:
+                    setattr(fresh, name, current + value)
+        for name in names:
+            setattr(self, name, getattr(fresh, name))
+
+    def change_marker(self):
+        """Changes whenever a snapshot would differ: new packets or a liveness transition."""
+        return self.packets_received, tuple(self.liveness_counts)
+
+    def worst_devices(self):
+        if len(self.devices):
+            return self.devices.worst(self.worst_k)
+        return sorted(self.worst, reverse=True)[:self.worst_k]
+
+    def snapshot(self):
+        received = self.packets_received
+        losses = self.losses
+        data = {
+            "bytes_per_report": round(self.total_report_size / received, 2) if received else 0,
+            "packets_received": received,
+            "duplicate_rate": round(self.total_duplicates / received, 3) if received else 0,
+            "sequence_gap_count": self.sequence_gap_count,
+            "cpu_ms_per_report": round(self.total_cpu_time / received, 3) if received else 0,
+            "packet_loss_percent": round(losses / (losses + received) * 100, 3) if received + losses > 0 else 0,
+            "avg_reporting_interval_in_ms": round(self.reporting_interval_sum / self.reporting_interval_count, 3)
+                                            if self.reporting_interval_count else 0,
+            "avg_delay_in_ms": round(self.total_delay / received, 3) if received else 0,
+            "avg_recv_batch": round(self.recv_packets / self.recv_wakeups, 2) if self.recv_wakeups else 0,
+            "recv_batch_distribution": " ".join(
+                f"{batch_bucket_label(i)}:{n}" for i, n in enumerate(self.recv_batch_buckets) if n
+            ),
+            "integrity_bytes_per_report": round(self.total_checksum_bytes / received, 2) if received else 0,
+            "checksum_us_per_report": round(self.total_checksum_time / received, 3) if received else 0,
+            "integrity_rejected": self.integrity_rejected,
+            "late_arrivals": self.late_arrivals,
+            "stale_arrivals": self.stale_arrivals,
+            "log_lines_suppressed": self.log_suppressed,
+            "worst_devices": " ".join(f"{dev_id}:{loss:.1f}%" for loss, _, dev_id in self.worst_devices()),
+            "loss_by_type": " ".join(
+                f"{sensor_type}:{self.types.loss_percent(row):.1f}%"
+                for row, sensor_type in sorted(enumerate(self.types.keys), key=lambda item: item[1])
+            ),
+            "devices_alive": self.liveness_counts[0],
+            "devices_suspect": self.liveness_counts[1],
+            "devices_dead": self.liveness_counts[2],
+            "stage_profile": self.stages.summary(),
+        }
+        for name, unit in HISTOGRAM_FIELDS:
+            values = getattr(self, name + "_hist").percentiles(PERCENTILES)
+            for label, value in zip(PERCENTILE_LABELS, values):
+                data[f"{name}_{label}_{unit}"] = round(value, 3)
+        return data
+
+
+def device_metrics_row(device, table):
+    """DeviceMetrics.csv row of one DeviceState, None before its first packet."""
+    if device.delay_hist is None or device.row is None:
+        return None
+    row = [device.sensor_type, device.dev_id] + table.summary(device.row)
+    for name, _ in HISTOGRAM_FIELDS:
+        hist = getattr(device, name + "_hist")
+        row += [round(v, 3) for v in hist.percentiles(PERCENTILES)]
+        row.append(hist.max if hist.max is not None else 0)
+    return row
+
+
+class DeviceMetricsWriter:
+    """Rewrites DeviceMetrics.csv (one row per device) on its own, slower timer."""
+
+    def __init__(self, path, interval=5.0):
+        self.path = path
+        self.interval = interval
+
+    def publish(self, rows):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(DEVICE_METRIC_FIELDS)
+            writer.writerows(sorted(rows, key=lambda row: row[1]))
+        os.replace(tmp_path, self.path)
+
+
+class MetricsSnapshotter:
+    """Publishes ServerMetrics to Metrics.csv on a timer instead of per packet.
+
+    overwrite mode keeps a single header + row (what the dashboard reads),
+    append mode keeps a time series with one timestamped row per snapshot.
+    Every published snapshot is also pushed to the live feed, if there is one,
+    the per-sensor-type table is rewritten to types_path and, once there are
+    stage timings, the per-stage table to stages_path.
+    """
+
+    def __init__(self, metrics, path, interval=0.5, append=False, feed=None, types_path=None, stages_path=None):
+        self.metrics = metrics
+        self.path = path
+        self.types_path = types_path
+        self.stages_path = stages_path
+        self.interval = interval
+        self.append = append
+        self.feed = feed
+        self.fields = (["timestamp"] + METRIC_FIELDS) if append else METRIC_FIELDS
+        self.last_publish = 0.0
+        self.last_published = None
+        self.publish_requested = False      # set by request_publish(), served by the next maybe_publish()
+
+        if append:
+            with open(path, "w", newline='') as f:
+                csv.writer(f).writerow(self.fields)
+
+    def request_publish(self):
+        """Safe from a signal handler: only sets a flag, the file is written by the next timer tick.
+
+        Publishing from the handler itself could interrupt a publish that is
+        halfway through the temp file and os.replace.
+        """
+        self.publish_requested = True
+
+    def maybe_publish(self, now=None):
+        now = time.monotonic() if now is None else now
+        if self.publish_requested:
+            self.publish_requested = False
+            self.publish(now, force=True)
+        elif now - self.last_publish >= self.interval:
+            self.publish(now)
+
+    def publish(self, now=None, force=False):
+        self.last_publish = time.monotonic() if now is None else now
+
+        # nothing new since the last snapshot -> don't touch the file
+        if not force and self.metrics.change_marker() == self.last_published:
+            return None
+        self.last_published = self.metrics.change_marker()
+
+        data = self.metrics.snapshot()
+        if self.append:
+            data["timestamp"] = round(time.time(), 3)
+            with open(self.path, "a", newline='') as f:
+                csv.writer(f).writerow([data[k] for k in self.fields])
+        else:
+            # write a temp file and swap it in so readers never see a half-written file
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(self.fields)
+                writer.writerow([data[k] for k in self.fields])
+            os.replace(tmp_path, self.path)
+
+        if self.types_path:
+            types = self.metrics.types
+            tmp_path = self.types_path + ".tmp"
+            with open(tmp_path, "w", newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(TYPE_METRIC_FIELDS)
+                writer.writerows([types.keys[row]] + types.summary(row)
+                                 for row in sorted(range(len(types)), key=types.keys.__getitem__))
+            os.replace(tmp_path, self.types_path)
+
+        if self.stages_path and self.metrics.stages:
+            tmp_path = self.stages_path + ".tmp"
+            with open(tmp_path, "w", newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(STAGE_FIELDS)
+                writer.writerows(self.metrics.stages.rows())
+            os.replace(tmp_path, self.stages_path)
+
+        if self.feed is not None:
+            self.feed.publish_metrics(data)
+        return data
@@ -0,0 +1,114 @@
+import cProfile
+
+from Histogram import Histogram, PERCENTILES
+from ServerLog import log
+
+# Opt-in profiling of the collector hot path (Server.py --profile-stages / --cprofile-packets).
+#
+# StageProfiler keeps one Histogram of nanoseconds per pipeline stage: the
+# histogram total is the cumulative time, its buckets give the percentiles,
+# and two profilers merge like the other histograms (SO_REUSEPORT workers).
+# Stages are the pipeline handlers plus two timed inside them: "checksum"
+# (part of storage) and "logging" (console lines, part of whichever handler
+# wrote them), so their share is not added to the pipeline total.
+#
+# PacketWindow runs cProfile over a window of packets and dumps a pstats file:
+#
+#     python3 -c "import pstats; pstats.Stats('Profile.pstats').sort_stats('cumulative').print_stats(20)"
+
+NESTED_STAGES = ("checksum", "logging")
+
+STAGE_SUB_BITS = 5
+
+STAGE_FIELDS = ["Stage", "Calls", "Total ms", "Share %", "Mean us",
+                "p50 us", "p90 us", "p99 us", "p999 us", "Max us"]
+
+
+class StageProfiler:
+    """Cumulative time and distribution per stage; empty (and never touched) unless profiling is on."""
+
+    __slots__ = ("stages",)
+
+    def __init__(self):
+        self.stages = {}        # {stage: Histogram of ns}, in pipeline order
+
+    def __bool__(self):
+        return bool(self.stages)
+
+    def add(self, names):
+        for name in names:
+            if name not in self.stages:
+                self.stages[name] = Histogram(STAGE_SUB_BITS)
+
+    def record(self, stage, seconds):
+        self.stages[stage].record(int(seconds * 1000000000))
+
+    def pipeline_ns(self):
+        return sum(hist.total for name, hist in self.stages.items() if name not in NESTED_STAGES)
+
+    def rows(self):
+        """STAGE_FIELDS rows, stages that never ran left out."""
+        pipeline = self.pipeline_ns()
+        rows = []
+        for name, hist in self.stages.items():
+            if not hist.count:
+                continue
+            rows.append([name, hist.count, round(hist.total / 1e6, 3),
+                         round(hist.total / pipeline * 100, 1) if pipeline else 0,
+                         round(hist.mean() / 1000, 3)]
+                        + [round(v / 1000, 3) for v in hist.percentiles(PERCENTILES)]
+                        + [round(hist.max / 1000, 3)])
+        return rows
+
+    def summary(self):
+        """Compact Metrics.csv form: stage:share%/p50us/p99us, pipeline order."""
+        return " ".join(f"{row[0]}:{row[3]}%/{row[5]}/{row[7]}us" for row in self.rows())
+
+    # ---- merging (SO_REUSEPORT workers) ----
+    def state(self):
+        return [(name, hist.state()) for name, hist in self.stages.items()]
+
+    def merge_state(self, state):
+        for name, hist_state in state:
+            self.add((name,))
+            self.stages[name].merge_state(hist_state)
+
+
+class PacketWindow:
+    """cProfile over packets [skip, skip + packets) of this process, dumped to path as pstats.
+
+    step(n) is called before every datagram or receive batch of n packets, so
+    the window starts and stops on batch boundaries. Traffic that stops
+    inside the window is dumped by close().
+    """
+
+    def __init__(self, path, packets, skip=0):
+        self.path = path
+        self.packets = packets
+        self.skip = skip
+        self.seen = 0
+        self.profile = None
+        self.started_at = None
+
+    def step(self, n):
+        """False once the capture is written and the window can be dropped."""
+        if self.profile is None:
+            if self.seen >= self.skip:
+                self.profile = cProfile.Profile()
+                self.started_at = self.seen
+                self.profile.enable()
+        elif self.seen - self.started_at >= self.packets:
+            self.dump()
+            return False
+        self.seen += n
+        return True
+
+    def dump(self):
+        self.profile.disable()
+        self.profile.dump_stats(self.path)
+        self.profile = None
+        log.log("INFO", f"cProfile of packets {self.started_at + 1}-{self.seen} written to {self.path}")
+
+    def close(self):
+        if self.profile is not None:
+            self.dump()
@@ -0,0 +1,76 @@
+import struct, time, hashlib, zlib
+
+# Shared wire format for Server.py and the sensor scripts.
+#
+#   header  : version, msg_type, count, sensor_type, device_id, seq, timestamp(ms)
+#   payload : count big-endian float32 values
+#   trailer : checksum of header + payload, algorithm selected by the version byte
+#
+# The integrity algorithm is negotiated in the INIT handshake: the sensor sends
+# its INIT with the version byte of the algorithm it wants, the server answers
+# with the version it accepted, and every later packet carries that version.
+
+INTEGRITY_MD5 = 1       # 16 bytes, the original protocol version
+INTEGRITY_CRC32 = 2     # 4 bytes, zlib.crc32
+INTEGRITY_HASH32 = 3    # 4 bytes, blake2s with a 4 byte digest
+
+INTEGRITY_ALGORITHMS = {"md5": INTEGRITY_MD5, "crc32": INTEGRITY_CRC32, "hash32": INTEGRITY_HASH32}
+INTEGRITY_NAMES = {v: k for k, v in INTEGRITY_ALGORITHMS.items()}
+CHECKSUM_SIZES = {INTEGRITY_MD5: 16, INTEGRITY_CRC32: 4, INTEGRITY_HASH32: 4}
+
+VERSION = INTEGRITY_MD5
+
+MSG_INIT = 0
+MSG_DATA = 1
+MSG_HEARTBEAT = 2
+MSG_LABELS = {MSG_INIT: "INIT", MSG_DATA: "DATA", MSG_HEARTBEAT: "HEARTBEAT"}
+
+HEADER_FORMAT = '!BBBBHHQ'
+HEADER = struct.Struct(HEADER_FORMAT)
+HEADER_SIZE = HEADER.size
+VALUE = struct.Struct('!f')
+CRC = struct.Struct('!I')
+CHECKSUM_SIZE = CHECKSUM_SIZES[INTEGRITY_MD5]
+MAX_PACKET_SIZE = 200
+MAX_VALUES = (MAX_PACKET_SIZE - HEADER_SIZE - CHECKSUM_SIZE) // 4
+
+# one precompiled struct per possible count (the header field is one byte)
+VALUES = [struct.Struct(f'!{n}f') for n in range(256)]
+
+
+def now_ms():
+    return int(time.time()*1000)
+
+
+def compute_checksum(data, integrity=INTEGRITY_MD5):
+    if integrity == INTEGRITY_CRC32:
+        return CRC.pack(zlib.crc32(data))
+    if integrity == INTEGRITY_HASH32:
+        return hashlib.blake2s(data, digest_size=4).digest()
+    return hashlib.md5(data).digest()
+
+
+# ---------------------- Decoding ----------------------
+def unpack_header(buf, offset=0):
+    """(version, msg_type, count, sensor_type, dev_id, seq, timestamp) without slicing buf."""
+    return HEADER.unpack_from(buf, offset)
+
+
+def unpack_values(buf, count, offset=HEADER_SIZE):
+    """All count floats of the payload in one unpack call."""
+    return VALUES[count].unpack_from(buf, offset)
+
+
+# ---------------------- Encoding ----------------------
+def pack_header(msg_type, count, sensor_type, dev_id, seq, timestamp=None, version=VERSION):
+    return HEADER.pack(version, msg_type, count, sensor_type, dev_id, seq,
+                       now_ms() if timestamp is None else timestamp)
+
+
+def encode_packet(msg_type, sensor_type, dev_id, seq, values=(), timestamp=None, integrity=INTEGRITY_MD5):
+    """Header + payload + checksum trailer, ready for sendto()."""
+    count = len(values)
+    packet = pack_header(msg_type, count, sensor_type, dev_id, seq, timestamp, integrity)
+    if count:
+        packet += VALUES[count].pack(*values)
+    return packet + compute_checksum(packet, integrity)
@@ -0,0 +1,74 @@
+import csv, io, os, time
+
+# row     -> every row is pushed to the OS as soon as it is written (old behaviour)
+# batched -> rows are kept in memory and pushed on a size or time threshold
+# fsync   -> like batched, but every flush is also fsync'ed to disk
+DURABILITY_MODES = ("row", "batched", "fsync")
+
+
+class ReadingsWriter:
+    """Keeps a CSV file open and writes the accepted rows in batches."""
+
+    def __init__(self, path, header=None, flush_rows=256, flush_interval=1.0,
+                 durability="batched", overwrite=True):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"unknown durability mode: {durability}")
+
+        self.path = path
+        self.flush_rows = 1 if durability == "row" else max(1, flush_rows)
+        self.flush_interval = flush_interval
+        self.durability = durability
+
+        self.file = open(path, "w" if overwrite else "a", newline='')
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+        if header is not None:
+            self.writer.writerow(header)
+            self.pending += 1
+            self.flush()
+
+    def write_row(self, row):
+        self.writer.writerow(row)
+        self.pending += 1
+        self._check_thresholds()
+
+    def write_rows(self, rows):
+        if not rows:
+            return
+        self.writer.writerows(rows)
+        self.pending += len(rows)
+        self._check_thresholds()
+
+    def _check_thresholds(self):
+        if self.pending >= self.flush_rows:
+            self.flush()
+        elif time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def maybe_flush(self):
+        """Flush on the time threshold only; called when the server is idle."""
+        if self.pending and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            # one write per flush, so each flush lands as a single append
+            self.file.write(self.buffer.getvalue())
+            self.buffer.seek(0)
+            self.buffer.truncate()
+            self.pending = 0
+            self.file.flush()
+            if self.durability == "fsync":
+                os.fsync(self.file.fileno())
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if self.file.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self.file.close()
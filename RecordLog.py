@@ -0,0 +1,153 @@
+import mmap, os, struct, time
+from collections import namedtuple
+
+from Protocol import MSG_LABELS
+
+# Fixed-size binary records, one per reading value, appended to one file.
+#
+#   header : magic, record size
+#   record : sensor_type, msg_type, index in batch, count, flags, dev_id, seq,
+#            sensor timestamp (ms), arrival (ms), value (NaN for INIT / HEARTBEAT)
+#
+# The record count is (file size - header) // record size, so there is no
+# index to keep in sync: every flush is one O_APPEND write of whole records,
+# which also lets all SO_REUSEPORT workers append to the same file, and the
+# last N records are always at a known offset from the end.
+
+MAGIC = b"IOTREC\x01\x00"
+RECORD = struct.Struct("<BBBBBxHHQQfxx")
+HEADER = struct.Struct("<8sI4x")
+RECORD_SIZE = RECORD.size
+HEADER_SIZE = HEADER.size
+
+FLAG_LOSS = 1           # ESTIMATED record
+FLAG_DUPLICATE = 2
+
+Record = namedtuple("Record", "sensor_type msg_type index count flags dev_id seq timestamp arrival value")
+NAN = float("nan")
+
+
+def write_header(path):
+    """Creates (or truncates) a log with just the header."""
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, RECORD_SIZE))
+
+
+class RecordLogWriter:
+    """Buffers packed records and appends them in one write per flush."""
+
+    def __init__(self, path="Readings.log", flush_rows=256, flush_interval=1.0, durability="batched",
+                 overwrite=True):
+        self.path = path
+        self.flush_rows = 1 if durability == "row" else max(1, flush_rows)
+        self.flush_interval = flush_interval
+        self.durability = durability
+        if overwrite or not os.path.exists(path):
+            write_header(path)
+
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+        self.buffer = bytearray()
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def write_values(self, sensor_type, dev_id, seq, msg_type, timestamp, arrival, values, duplicate=False):
+        """One record per value, or a single NaN record for a packet without values."""
+        pack = RECORD.pack
+        flags = FLAG_DUPLICATE if duplicate else 0
+        count = len(values)
+        buffer = self.buffer
+        for i, v in enumerate(values or (NAN,)):
+            buffer += pack(sensor_type, msg_type, i, count, flags, dev_id, seq, timestamp, arrival, v)
+        self.pending += count or 1
+        self._check_thresholds()
+
+    def write_estimated(self, sensor_type, dev_id, first_seq, timestamp, arrival, values):
+        pack = RECORD.pack
+        buffer = self.buffer
+        for i, v in enumerate(values):
+            buffer += pack(sensor_type, 1, 0, 1, FLAG_LOSS, dev_id, (first_seq + i) & 0xFFFF,
+                           timestamp, arrival, v)
+        self.pending += len(values)
+        self._check_thresholds()
+
+    def _check_thresholds(self):
+        if self.pending >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def maybe_flush(self):
+        """Flush on the time threshold only; called when the server is idle."""
+        if self.pending and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            os.write(self.fd, self.buffer)
+            if self.durability == "fsync":
+                os.fsync(self.fd)
+            del self.buffer[:]
+            self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if self.fd is None:
+            return
+        try:
+            self.flush()
+        finally:
+            os.close(self.fd)
+            self.fd = None
+
+
+# ---------------------- Reading ----------------------
+def record_count(path):
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return 0
+    return max(0, (size - HEADER_SIZE) // RECORD_SIZE)
+
+
+def read_records(path, start=0, stop=None):
+    """Records [start, stop) as Record tuples; negative indexes count from the end.
+
+    The file is mapped only for the duration of the call, so a reader never
+    keeps it open while the server truncates it on restart.
+    """
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return []
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        total = max(0, (size - HEADER_SIZE) // RECORD_SIZE)
+        start, stop, _ = slice(start, stop).indices(total)
+        if start >= stop:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            if m[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a record log")
+            offset = HEADER_SIZE + start * RECORD_SIZE
+            return [Record._make(fields) for fields in
+                    RECORD.iter_unpack(m[offset:HEADER_SIZE + stop * RECORD_SIZE])]
+
+
+def tail(path, n):
+    """The last n records, in constant time whatever the size of the log."""
+    return read_records(path, -n) if n > 0 else []
+
+
+def iter_records(path, chunk=65536):
+    """Every record of the log, read chunk records at a time (offline analysis)."""
+    start = 0
+    while True:
+        records = read_records(path, start, start + chunk)
+        if not records:
+            return
+        yield from records
+        start += len(records)
+
+
+def record_label(record):
+    if record.flags & FLAG_LOSS:
+        return "ESTIMATED"
+    return MSG_LABELS.get(record.msg_type, str(record.msg_type))
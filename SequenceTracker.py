@@ -0,0 +1,67 @@
+SEQ_MODULUS = 1 << 16     # the header seq field is 16 bits and wraps around
+SEQ_HALF = SEQ_MODULUS >> 1
+
+# classify() results
+IN_ORDER = 0    # highest + 1
+GAP = 1         # ahead of highest + 1, n = packets skipped
+DUPLICATE = 2   # already seen inside the window
+LATE = 3        # missing packet arriving out of order inside the window, n = distance behind highest
+STALE = 4       # behind the window, can't tell late from duplicate
+
+
+def next_seq(seq):
+    return (seq + 1) % SEQ_MODULUS
+
+
+_masks = {}     # {window: (1 << window) - 1}, one shared int per window size instead of one per device
+
+
+def window_mask(window):
+    mask = _masks.get(window)
+    if mask is None:
+        mask = _masks[window] = (1 << window) - 1
+    return mask
+
+
+class SequenceTracker:
+    """Per-device highest sequence number plus a bitmap of the last `window` seqs.
+
+    Bit i of the bitmap is set when seq (highest - i) has been received, so
+    duplicate / gap / reorder classification is a shift and a mask no matter
+    how large the window is. Distances use 16-bit serial number arithmetic, so
+    65535 -> 0 is an in-order step, not a gap of -65535.
+    """
+
+    __slots__ = ("highest", "window", "mask", "bitmap", "span")
+
+    def __init__(self, first_seq, window=256):
+        self.highest = first_seq
+        self.window = window
+        self.mask = window_mask(window)
+        self.bitmap = 1
+        self.span = 1       # seqs covered by the bitmap so far, never more than window
+
+    def classify(self, seq):
+        """Record seq and return (kind, n)."""
+        ahead = (seq - self.highest) % SEQ_MODULUS
+        if ahead == 0:
+            return DUPLICATE, 0
+
+        if ahead < SEQ_HALF:
+            if ahead >= self.window:
+                self.bitmap = 1
+            else:
+                self.bitmap = ((self.bitmap << ahead) | 1) & self.mask
+            self.highest = seq
+            self.span = min(self.span + ahead, self.window)
+            return (IN_ORDER, 0) if ahead == 1 else (GAP, ahead - 1)
+
+        behind = SEQ_MODULUS - ahead
+        if behind >= self.span:
+            return STALE, behind
+
+        bit = 1 << behind
+        if self.bitmap & bit:
+            return DUPLICATE, behind
+        self.bitmap |= bit
+        return LATE, behind
@@ -0,0 +1,83 @@
+from array import array
+
+ALL = "All"     # key of the series that aggregates every device
+EMPTY = -(1 << 63)      # epoch of a slot that never held a bucket
+
+
+class DownsampledSeries:
+    """The last `buckets * bucket_seconds` seconds of a signal in fixed memory.
+
+    Every sample is folded into the time bucket it falls in (min / max / sum /
+    count), the buckets form a ring indexed by bucket number, so adding is
+    O(1) and plotting walks at most `buckets` points whatever the sample rate
+    or the length of the test.
+    """
+
+    __slots__ = ("bucket_seconds", "size", "epochs", "mins", "maxs", "sums", "counts", "latest", "changes")
+
+    def __init__(self, buckets=120, bucket_seconds=1.0):
+        self.bucket_seconds = bucket_seconds
+        self.size = buckets
+        self.epochs = array('q', [EMPTY] * buckets)     # bucket number held by each slot
+        self.mins = array('d', bytes(8 * buckets))
+        self.maxs = array('d', bytes(8 * buckets))
+        self.sums = array('d', bytes(8 * buckets))
+        self.counts = array('q', bytes(8 * buckets))
+        self.latest = -1
+        self.changes = 0        # bumped on every add, lets a chart skip redraws
+
+    def add(self, t, value):
+        epoch = int(t // self.bucket_seconds)
+        if epoch <= self.latest - self.size:
+            return      # older than the window
+        slot = epoch % self.size
+        if self.epochs[slot] != epoch:
+            self.epochs[slot] = epoch
+            self.mins[slot] = self.maxs[slot] = self.sums[slot] = value
+            self.counts[slot] = 1
+        else:
+            if value < self.mins[slot]:
+                self.mins[slot] = value
+            elif value > self.maxs[slot]:
+                self.maxs[slot] = value
+            self.sums[slot] += value
+            self.counts[slot] += 1
+        if epoch > self.latest:
+            self.latest = epoch
+        self.changes += 1
+
+    def points(self):
+        """[(bucket start time, min, max, mean)] of the buckets inside the window, oldest first."""
+        points = []
+        size = self.size
+        for epoch in range(self.latest - size + 1, self.latest + 1):
+            slot = epoch % size
+            if self.epochs[slot] == epoch:
+                points.append((epoch * self.bucket_seconds, self.mins[slot], self.maxs[slot],
+                               self.sums[slot] / self.counts[slot]))
+        return points
+
+
+class SeriesStore:
+    """DownsampledSeries by (metric, device) key, created on first use."""
+
+    def __init__(self, buckets=120, bucket_seconds=1.0):
+        self.buckets = buckets
+        self.bucket_seconds = bucket_seconds
+        self.series = {}
+
+    def add(self, metric, device, t, value):
+        key = (metric, device)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = DownsampledSeries(self.buckets, self.bucket_seconds)
+        series.add(t, value)
+
+    def get(self, metric, device=ALL):
+        return self.series.get((metric, device))
+
+    def devices(self):
+        return sorted({device for _, device in self.series if device != ALL})
+
+    def clear(self):
+        self.series.clear()
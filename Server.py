@@ -1,295 +1,246 @@
-import json
-import os
-import socket, struct, time, csv, hashlib
-
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.bind(('0.0.0.0', 9999))
-print("Server started...", flush=True)
-
-######GLOBALS#########
-HEADER_FORMAT = '!BBBBHHQ'
-
-payload_limit_bytes = 200
-recentPacketLimit = 5
-recentPackets = {}
-last_heartbeat = {}
-counter = 0
-device_map = {}
-
-loss_tolerance = 0.05
-losses = 0
-packets_received = 0
-total_report_size = 0
-total_duplicates = 0
-sequence_gap_count = 0
-cpu_ms_per_report = 0
-total_cpu_time = 0
-
-#delay
-avg_delay_in_ms = 0
-total_delay = 0
-
-# -------- Reporting Interval --------
-last_arrival = {}
-reporting_interval_sum = 0
-reporting_interval_count = 0
-
-# -------- Value history for MOVING AVERAGE --------
-value_history = {}   # {dev_id: [recent_values]}
+import argparse, asyncio, signal, socket
+
+from ReadingsWriter import DURABILITY_MODES
+from Protocol import INTEGRITY_ALGORITHMS
+from Collector import Collector, FILL_STRATEGIES, STORAGE_SINKS, valueHistoryLimit
+from AsyncCollector import run_async
+from LoopCollector import run_loop
+from WorkerPool import run_workers
+from ServerLog import log, LEVELS, WARNING, rate_limits_for
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--mode", choices=("loop", "asyncio"), default="loop",
+                    help="loop = blocking recvfrom loop, asyncio = DatagramProtocol collector")
+parser.add_argument("--host", default="0.0.0.0")
+parser.add_argument("--port", type=int, default=9999)
+parser.add_argument("--recv-batch", type=int, default=64,
+                    help="loop mode: max datagrams drained per wakeup (1 = one recvfrom per packet)")
+parser.add_argument("--workers", type=int, default=1,
+                    help="worker processes sharing the port via SO_REUSEPORT (Linux only)")
+parser.add_argument("--flush-rows", type=int, default=256,
+                    help="buffered readings rows before SensorsLogs.csv is flushed")
+parser.add_argument("--flush-interval", type=float, default=1.0,
+                    help="max seconds a buffered row waits before being flushed")
+parser.add_argument("--durability", choices=DURABILITY_MODES, default="batched",
+                    help="row = flush every row, batched = size/time thresholds, fsync = batched + fsync")
+parser.add_argument("--storage", default="log",
+                    help="readings sinks, comma separated: log = Readings.log fixed records (default, dashboard "
+                         "table), csv = SensorsLogs.csv text rows, npy = typed column segments in --storage-dir "
+                         "(kept across runs)")
+parser.add_argument("--storage-dir", default="Readings",
+                    help="directory of the npy segments")
+parser.add_argument("--segment-rows", type=int, default=1 << 20,
+                    help="rows per npy segment before a new one is started")
+parser.add_argument("--segment-seconds", type=float, default=600,
+                    help="max age of an npy segment before a new one is started")
+parser.add_argument("--live-host", default="127.0.0.1",
+                    help="address the live push channel binds to (the WSL interface IP to reach it from Windows)")
+parser.add_argument("--live-allow", default="127.0.0.1",
+                    help="comma separated source IPs allowed to subscribe to the live feed")
+parser.add_argument("--live-port", type=int, default=9998,
+                    help="UDP port of the live push channel to the dashboard, 0 = disabled")
+parser.add_argument("--metrics-interval", type=float, default=0.5,
+                    help="seconds between Metrics.csv snapshots")
+parser.add_argument("--metrics-append", action="store_true",
+                    help="append a timestamped snapshot row instead of overwriting Metrics.csv")
+parser.add_argument("--device-metrics-interval", type=float, default=5.0,
+                    help="seconds between DeviceMetrics.csv rewrites (per-device percentiles), 0 = off")
+parser.add_argument("--worst-devices", type=int, default=5,
+                    help="devices listed in the worst_devices metric (highest loss rate first)")
+parser.add_argument("--heartbeat-timeout", type=float, default=20,
+                    help="seconds without a heartbeat before a device is reported")
+parser.add_argument("--heartbeat-type-timeouts", default="",
+                    help="per sensor type heartbeat timeouts, e.g. 0=20,2=60 (others use --heartbeat-timeout)")
+parser.add_argument("--heartbeat-dead-after", type=float, default=3.0,
+                    help="heartbeat timeouts of silence before a suspect device is marked dead")
+parser.add_argument("--seq-window", type=int, default=256,
+                    help="per-device sequence window for duplicate / reorder detection (max 32768)")
+parser.add_argument("--history-window", type=int, default=valueHistoryLimit,
+                    help="last real values per device used for the mean estimate")
+parser.add_argument("--fill", choices=FILL_STRATEGIES, default="mean",
+                    help="ESTIMATED rows for lost packets: mean, ewma, linear interpolation or none")
+parser.add_argument("--ewma-alpha", type=float, default=0.3,
+                    help="weight of the newest value in the ewma estimate")
+parser.add_argument("--max-fill-rows", type=int, default=1024,
+                    help="max ESTIMATED rows per gap, longer gaps are also recorded in Gaps.csv")
+parser.add_argument("--integrity", default="md5,crc32,hash32",
+                    help="integrity checks accepted at INIT, in preference order (first = fallback)")
+parser.add_argument("--log-level", choices=LEVELS, default="info",
+                    help="lowest console line level (DATA / BATCH / HEARTBEAT are info, LOSS / NOISE warning)")
+parser.add_argument("--quiet", action="store_true",
+                    help="production mode: warnings and errors only (same as --log-level warning)")
+parser.add_argument("--log-rate", type=float, default=1.0,
+                    help="min seconds between two per-packet lines of one device and category, 0 = no limit")
+parser.add_argument("--profile-stages", action="store_true",
+                    help="time every pipeline stage: stage_profile in Metrics.csv, StageProfile.csv")
+parser.add_argument("--cprofile-packets", type=int, default=0,
+                    help="run cProfile over this many packets and write Profile.pstats, 0 = off")
+parser.add_argument("--cprofile-skip", type=int, default=0,
+                    help="packets let through before the --cprofile-packets window starts")
+args = parser.parse_args()
+
+if not 1 <= args.seq_window <= 32768:
+    parser.error("--seq-window must be between 1 and 32768")
+if args.max_fill_rows < 0:
+    parser.error("--max-fill-rows must be 0 or more")
+if args.history_window < 1:
+    parser.error("--history-window must be at least 1")
+if args.heartbeat_timeout <= 0:
+    parser.error("--heartbeat-timeout must be more than 0")
+if args.heartbeat_dead_after < 1:
+    parser.error("--heartbeat-dead-after must be at least 1")
+try:
+    heartbeat_type_timeouts = {
+        int(sensor_type): float(seconds)
+        for sensor_type, seconds in (item.split("=") for item in args.heartbeat_type_timeouts.split(",") if item.strip())
+    }
+except ValueError:
+    parser.error("--heartbeat-type-timeouts takes TYPE=SECONDS pairs, e.g. 0=20,2=60")
+if any(seconds <= 0 for seconds in heartbeat_type_timeouts.values()):
+    parser.error("--heartbeat-type-timeouts must be more than 0")
+if args.worst_devices < 0:
+    parser.error("--worst-devices must be 0 or more")
+if args.device_metrics_interval < 0:
+    parser.error("--device-metrics-interval must be 0 or more")
+if args.cprofile_packets < 0 or args.cprofile_skip < 0:
+    parser.error("--cprofile-packets and --cprofile-skip must be 0 or more")
+if not 0 < args.ewma_alpha <= 1:
+    parser.error("--ewma-alpha must be in (0, 1]")
+
+storage = [name.strip() for name in args.storage.split(",") if name.strip()]
+if not storage or any(name not in STORAGE_SINKS for name in storage):
+    parser.error(f"--storage takes a comma separated list of {', '.join(STORAGE_SINKS)}")
+
+try:
+    integrity = [INTEGRITY_ALGORITHMS[name.strip()] for name in args.integrity.split(",")]
+except KeyError as e:
+    parser.error(f"unknown integrity algorithm {e}, choose from {', '.join(INTEGRITY_ALGORITHMS)}")
+
+live_allow = [ip.strip() for ip in args.live_allow.split(",") if ip.strip()]
+try:
+    for ip in live_allow:
+        socket.inet_aton(ip)
+except OSError:
+    parser.error("--live-allow takes a comma separated list of IPv4 addresses")
+
+log_level = WARNING if args.quiet else LEVELS[args.log_level]
+log_rate_limits = rate_limits_for(args.log_rate)
 
 readings_file = "SensorsLogs.csv"
 metrics_file = "Metrics.csv"
+gaps_file = "Gaps.csv"
+log_file = "Readings.log"
+device_metrics_file = "DeviceMetrics.csv"
+type_metrics_file = "TypeMetrics.csv"
+stages_file = "StageProfile.csv"
+cprofile_file = "Profile.pstats"
+
+
+# ---------------------- Shutdown ----------------------
+def handle_sigterm(signum, frame):
+    raise SystemExit(0)
+
+
+def main():
+    log.configure(log_level, log_rate_limits)
+    if args.workers > 1:
+        signal.signal(signal.SIGTERM, handle_sigterm)
+        try:
+            run_workers(args.workers, {
+                "mode": args.mode, "host": args.host, "port": args.port,
+                "recv_batch": args.recv_batch,
+                "readings_file": readings_file,
+                "gaps_file": gaps_file,
+                "log_file": log_file,
+                "flush_rows": args.flush_rows,
+                "flush_interval": args.flush_interval,
+                "durability": args.durability,
+                "metrics_interval": args.metrics_interval,
+                "device_metrics_file": device_metrics_file,
+                "device_metrics_interval": args.device_metrics_interval,
+                "type_metrics_file": type_metrics_file,
+                "worst_devices": args.worst_devices,
+                "heartbeat_timeout": args.heartbeat_timeout,
+                "heartbeat_type_timeouts": heartbeat_type_timeouts,
+                "heartbeat_dead_after": args.heartbeat_dead_after,
+                "profile_stages": args.profile_stages,
+                "stages_file": stages_file,
+                "cprofile_file": cprofile_file,
+                "cprofile_packets": args.cprofile_packets,
+                "cprofile_skip": args.cprofile_skip,
+                "integrity": integrity,
+                "seq_window": args.seq_window,
+                "history_window": args.history_window,
+                "fill": args.fill,
+                "ewma_alpha": args.ewma_alpha,
+                "max_fill_rows": args.max_fill_rows,
+                "storage": storage,
+                "storage_dir": args.storage_dir,
+                "segment_rows": args.segment_rows,
+                "segment_seconds": args.segment_seconds,
+                "log_level": log_level,
+                "log_rate_limits": log_rate_limits,
+            }, metrics_file, args.metrics_append, args.live_host, args.live_port, live_allow)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            log.shutdown()
+            if "csv" in storage:
+                print("[CSV] SensorsLogs.csv flushed and closed.", flush=True)
+        return
+
+    collector = Collector(
+        readings_file, metrics_file, gaps_file, log_file,
+        flush_rows=args.flush_rows,
+        flush_interval=args.flush_interval,
+        durability=args.durability,
+        metrics_interval=args.metrics_interval,
+        metrics_append=args.metrics_append,
+        device_metrics_file=device_metrics_file,
+        device_metrics_interval=args.device_metrics_interval,
+        type_metrics_file=type_metrics_file,
+        worst_devices=args.worst_devices,
+        heartbeat_timeout=args.heartbeat_timeout,
+        heartbeat_type_timeouts=heartbeat_type_timeouts,
+        heartbeat_dead_after=args.heartbeat_dead_after,
+        profile_stages=args.profile_stages,
+        stages_file=stages_file,
+        cprofile_file=cprofile_file,
+        cprofile_packets=args.cprofile_packets,
+        cprofile_skip=args.cprofile_skip,
+        integrity=integrity,
+        seq_window=args.seq_window,
+        history_window=args.history_window,
+        fill=args.fill,
+        ewma_alpha=args.ewma_alpha,
+        max_fill_rows=args.max_fill_rows,
+        storage=storage,
+        storage_dir=args.storage_dir,
+        segment_rows=args.segment_rows,
+        segment_seconds=args.segment_seconds,
+        live_host=args.live_host,
+        live_port=args.live_port,
+        live_allow=live_allow
+    )
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    # on demand snapshot: kill -USR1 <server pid>
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: collector.request_metrics())
 
-
-# ---------------------- send_metrics ----------------------
-def send_metrics(bytes_per_report, packets_received, duplicate_rate,
-                 sequence_gap_count, cpu_ms_per_report, loss_percent,
-                 avg_reporting_interval_in_ms, avg_delay_in_ms):
-
-    metrics_data = {
-        "bytes_per_report": round(bytes_per_report, 2),
-        "packets_received": packets_received,
-        "duplicate_rate": round(duplicate_rate, 3),
-        "sequence_gap_count": sequence_gap_count,
-        "cpu_ms_per_report": round(cpu_ms_per_report, 3),
-        "packet_loss_percent": round(loss_percent, 3),
-        "avg_reporting_interval_in_ms": round(avg_reporting_interval_in_ms, 3),
-        "avg_delay_in_ms": round(avg_delay_in_ms, 3)
-    }
-
-    with open(metrics_file, "w", newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            "bytes_per_report", "packets_received", "duplicate_rate",
-            "sequence_gap_count", "cpu_ms_per_report",
-            "packet_loss_percent", "avg_reporting_interval_in_ms", "avg_delay_in_ms"
-        ])
-        writer.writerow([
-            metrics_data["bytes_per_report"],
-            metrics_data["packets_received"],
-            metrics_data["duplicate_rate"],
-            metrics_data["sequence_gap_count"],
-            metrics_data["cpu_ms_per_report"],
-            metrics_data["packet_loss_percent"],
-            metrics_data["avg_reporting_interval_in_ms"],
-            metrics_data["avg_delay_in_ms"]
-        ])
-
-
-def msg_label(t):
-    return {0:"INIT",1:"DATA",2:"HEARTBEAT"}.get(t,str(t))
-
-
-# ---------------------- Initialize CSV (overwrite) ----------------------
-with open(readings_file, "w", newline='') as f:
-    writer = csv.writer(f)
-    writer.writerow([
-        "Sensor Type","ID","Seq","Timestamp","Arrival","Msg Type",
-        "Temperature","Humidity","Pressure","Packet Loss","Duplicate","ReadingCount"
-    ])
-print("[CSV] SensorsLogs.csv overwritten.", flush=True)
-
-
-header_size = struct.calcsize(HEADER_FORMAT)
-
-# ========================= MAIN LOOP =========================
-while True:
     try:
-        packet, addr = sock.recvfrom(200)
-        start = time.perf_counter()
-
-        data = packet[:-16]
-        checksum = packet[-16:]
-        
-
-        version, msg_type, count, sensor_type, dev_id, seq, timestamp = struct.unpack(
-            HEADER_FORMAT, data[:header_size]
-        )
-
-        time_received = int(time.time()*1000)
-        delay = time_received - timestamp
-
-
-        # -------- Noise Check --------
-        expected_size = count * 4 + header_size
-        if expected_size != len(data) or len(packet) > 200:
-            print("[NOISE] Invalid payload size", flush=True)
-            continue
-        else:
-            total_report_size += len(packet)
-
-        total_delay += delay
-        index = header_size
-        temp = hum = pres = ""
-        duplicate = False
-        label = msg_label(msg_type)
-
-        # -------- Reporting Interval --------
-        if dev_id in last_arrival:
-            interval = time_received - last_arrival[dev_id]
-            reporting_interval_sum += interval
-            reporting_interval_count += 1
-        last_arrival[dev_id] = time_received
-
-        if reporting_interval_count > 0:
-            avg_reporting_interval_in_ms = reporting_interval_sum / reporting_interval_count
-        else:
-            avg_reporting_interval_in_ms = 0
-
-
-        # ---------- HANDSHAKE ----------
-        if msg_type == 0:
-            if (addr, sensor_type) not in device_map:
-                counter += 1
-                dev_id = counter
-                device_map[(addr, sensor_type)] = dev_id
-
-                response = struct.pack(HEADER_FORMAT, 1, 0, 0, sensor_type, dev_id, 0, int(time.time()*1000))
-                sock.sendto(response, addr)
-
-                recentPackets[dev_id] = []      #recent seq numbers for duplicates and loss detection
-                value_history[dev_id] = []      # MOVING AVERAGE HISTORY INIT
-                print(f"[HANDSHAKE] Type={sensor_type} assigned ID={dev_id}", flush=True)
-
-            else:
-                dev_id = device_map[(addr, sensor_type)]
-                seq = max(recentPackets.get(dev_id, [0])) + 1
-                response = struct.pack(HEADER_FORMAT, 1, 0, 0, sensor_type, dev_id, seq, int(time.time()*1000))
-                sock.sendto(response, addr)
-                print(f"[INFO] Device already registered (ID={dev_id})", flush=True)
-
-        # ---------- DUPLICATE + LOSS ----------
-        if seq in recentPackets.get(dev_id, []):
-            duplicate = True
-            total_duplicates += 1
-            print(f"[DUPLICATE] seq={seq}", flush=True)
-
+        if args.mode == "asyncio":
+            asyncio.run(run_async(collector, args.host, args.port))
         else:
-            if dev_id in recentPackets and recentPackets[dev_id]:
-
-                max_seq = max(recentPackets[dev_id])
-
-                # ======== MOVING AVERAGE LOSS SMOOTHING ========
-                if seq > max_seq + 1:
-                    missing = seq - max_seq - 1
-                    losses += missing
-                    sequence_gap_count += 1
-                    print(f"[LOSS] Missing {missing} packets, filling with MOVING AVERAGE", flush=True)
-
-                    # Compute moving average
-                    if dev_id in value_history and len(value_history[dev_id]) > 0:
-                        avg_value = sum(value_history[dev_id]) / len(value_history[dev_id])
-                    else:
-                        avg_value = 0  # fallback
-
-                    # Write estimated rows for missing seq numbers
-                    for i in range(missing):
-                        est_seq = max_seq + 1 + i
-
-                        with open(readings_file, "a", newline='') as f:
-                            writer = csv.writer(f)
-                            writer.writerow([
-                                sensor_type, dev_id, est_seq,
-                                round(timestamp,3),
-                                round(time.time(),3),
-                                "ESTIMATED",
-                                avg_value if sensor_type == 0 else "",
-                                avg_value if sensor_type == 1 else "",
-                                avg_value if sensor_type == 2 else "",
-                                1,     # loss flag
-                                0,     # duplicate flag
-                                1
-                            ])
-
-            recentPackets.setdefault(dev_id, []).append(seq)
-            if len(recentPackets[dev_id]) > recentPacketLimit:
-                recentPackets[dev_id].pop(0)
-
-        packets_received += 1
-
-
-        # ---------- DATA ----------
-        batch_values_str = None
-
-        if msg_type == 1:
-            values = []
-            for _ in range(count):
-                v = struct.unpack('!f', data[index:index+4])[0]
-                index += 4
-                values.append(v)
-
-            # Save real values into history
-            if dev_id not in value_history:
-                value_history[dev_id] = []
-
-            for v in values:
-                value_history[dev_id].append(v)
-                if len(value_history[dev_id]) > 5:
-                    value_history[dev_id].pop(0)
-
-            if count == 1:
-                v = values[0]
-                if sensor_type == 0: temp = v
-                if sensor_type == 1: hum = v
-                if sensor_type == 2: pres = v
-                print(f"[DATA] Single: Type={sensor_type} ID={dev_id} seq={seq} = {v:.2f}", flush=True)
-
-            else:
-                batch_values_str = ",".join([f"{v:.2f}" for v in values])
-                print(f"[BATCH seq={seq}] {batch_values_str}", flush=True)
-
-        # ---------- HEARTBEAT ----------
-        if msg_type == 2:
-            last_heartbeat[dev_id] = time.time()
-            print(f"[HEARTBEAT] Device {dev_id} alive", flush=True)
-
-        # ---------- CHECKSUM & CSV ----------
-        if hashlib.md5(data).digest() == checksum:
-
-            with open(readings_file, "a", newline='') as f:
-                writer = csv.writer(f)
-
-                if batch_values_str is not None:
-                    if sensor_type == 0: temp = batch_values_str
-                    elif sensor_type == 1: hum = batch_values_str
-                    elif sensor_type == 2: pres = batch_values_str
-
-                    writer.writerow([
-                        sensor_type, dev_id, seq, round(timestamp,3), round(time.time(),3),
-                        label, temp, hum, pres,0, duplicate, count
-                    ])
-                else:
-                    writer.writerow([
-                        sensor_type, dev_id, seq, round(timestamp,3), round(time.time(),3),
-                        label,
-                        f"{temp:.2f}" if temp != "" else "",
-                        f"{hum:.2f}" if hum != "" else "",
-                        f"{pres:.2f}" if pres != "" else "",
-                        0, duplicate, count
-                    ])
-
-        else:
-            print(f"[CHECKSUM ERROR] seq={seq}", flush=True)
-
-        # ---------- METRICS ----------
-        avg_delay_in_ms = total_delay / packets_received if packets_received else 0
-        loss_percent = (losses / (losses + packets_received)) * 100 if packets_received + losses > 0 else 0
-        bytes_per_report = total_report_size / packets_received if packets_received else 0
-        duplicate_rate = total_duplicates / packets_received if packets_received else 0
-
-        end = time.perf_counter()
-        total_cpu_time += (end - start) * 1000
-        cpu_ms_per_report = total_cpu_time / packets_received if packets_received else 0
-
-        send_metrics(bytes_per_report, packets_received, duplicate_rate,
-                     sequence_gap_count, cpu_ms_per_report,
-                     loss_percent, avg_reporting_interval_in_ms, avg_delay_in_ms)
-
-        # ---------- HEARTBEAT TIMEOUT ----------
-        for id, last in list(last_heartbeat.items()):
-            if time.time() - last > 20:
-                print(f"[WARNING] ID={id} missed heartbeat!", flush=True)
-                del last_heartbeat[id]
-
-    except Exception as e:
-        print(f"[SERVER ERROR] {e}", flush=True)
+            run_loop(collector, args.host, args.port, recv_batch=args.recv_batch)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.close()
+        log.shutdown()
+        if "csv" in storage:
+            print("[CSV] SensorsLogs.csv flushed and closed.", flush=True)
+
+
+if __name__ == "__main__":
+    main()
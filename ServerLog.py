@@ -0,0 +1,120 @@
+import logging, logging.handlers, queue, sys, time
+
+# Server console output: "[CATEGORY] message" lines with a level per category,
+# per-category rate limits and a queue in front of stdout, so the packet path
+# never blocks on the pipe the dashboard reads.
+#
+# Hot path call sites check first, so a suppressed line is never formatted:
+#
+#     if log.enabled("DATA", ctx.dev_id):
+#         log.emit("DATA", f"Single: ...")
+
+DEBUG, INFO, WARNING, ERROR = logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+
+CATEGORY_LEVELS = {
+    "DATA": INFO, "BATCH": INFO, "HEARTBEAT": INFO, "HANDSHAKE": INFO, "INFO": INFO,
+    "DUPLICATE": INFO, "LATE": INFO, "STORAGE": INFO, "LIVE": INFO,
+    "LOSS": WARNING, "GAP": WARNING, "STALE": WARNING, "NOISE": WARNING,
+    "CHECKSUM ERROR": WARNING, "INTEGRITY": WARNING, "WARNING": WARNING,
+    "SERVER ERROR": ERROR,
+}
+
+# seconds between two lines of the same category and key (dev_id / source address)
+DEFAULT_RATE_LIMITS = {"DATA": 1.0, "BATCH": 1.0, "HEARTBEAT": 1.0, "DUPLICATE": 1.0, "LATE": 1.0,
+                       "LOSS": 1.0, "GAP": 1.0, "STALE": 1.0, "NOISE": 1.0, "CHECKSUM ERROR": 1.0,
+                       "INTEGRITY": 1.0, "LIVE": 1.0}
+
+QUEUE_SIZE = 10000
+
+
+class ServerLog:
+    """Level check + rate limit + suppressed line counter in front of a logging.Logger."""
+
+    def __init__(self, name="iot"):
+        self.logger = logging.getLogger(name)
+        self.logger.propagate = False
+        self.level = INFO
+        self.rate_limits = dict(DEFAULT_RATE_LIMITS)
+        self.last_line = {}         # {(category, key): time.monotonic() of the last line}
+        self.suppressed = 0         # filtered by level, rate limited or dropped on a full queue
+        self.listener = None
+        self.stages = None          # StageProfiler timing emit() as "logging" (--profile-stages)
+
+    def enabled(self, category, key=None):
+        """True when a line of this category (and key) may be written now; counts it otherwise."""
+        if CATEGORY_LEVELS.get(category, INFO) < self.level:
+            self.suppressed += 1
+            return False
+        interval = self.rate_limits.get(category)
+        if interval:
+            now = time.monotonic()
+            slot = (category, key)
+            if now - self.last_line.get(slot, -interval) < interval:
+                self.suppressed += 1
+                return False
+            self.last_line[slot] = now
+        return True
+
+    def emit(self, category, message):
+        """Writes the line without any check; use after enabled()."""
+        if self.stages is None:
+            self.logger.log(CATEGORY_LEVELS.get(category, INFO), f"[{category}] {message}")
+            return
+        start = time.perf_counter()
+        self.logger.log(CATEGORY_LEVELS.get(category, INFO), f"[{category}] {message}")
+        self.stages.record("logging", time.perf_counter() - start)
+
+    def log(self, category, message, key=None):
+        if self.enabled(category, key):
+            self.emit(category, message)
+
+    def error(self, message):
+        self.log("SERVER ERROR", message)
+
+    # ---- setup ----
+    def configure(self, level=INFO, rate_limits=None, stream=None):
+        """Starts the queue listener thread; call once per process (again in forked workers)."""
+        self.shutdown()
+        self.level = level
+        if rate_limits is not None:
+            self.rate_limits = rate_limits
+        self.last_line.clear()
+
+        records = queue.Queue(QUEUE_SIZE)
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(logging.Formatter("%(message)s"))
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+        self.logger.addHandler(_DroppingQueueHandler(records, self))
+        self.logger.setLevel(level)
+        self.listener = logging.handlers.QueueListener(records, output)
+        self.listener.start()
+
+    def shutdown(self):
+        """Writes out everything still queued and stops the listener thread."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks: a line that finds the queue full is dropped and counted."""
+
+    def __init__(self, records, owner):
+        super().__init__(records)
+        self.owner = owner
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.owner.suppressed += 1
+
+
+def rate_limits_for(interval):
+    """DEFAULT_RATE_LIMITS with every per-device interval replaced, 0 = no rate limit."""
+    return {category: interval for category in DEFAULT_RATE_LIMITS} if interval else {}
+
+
+log = ServerLog()
@@ -0,0 +1,60 @@
+import math
+
+# Hashed timing wheel for per-device deadlines (heartbeat timeouts).
+#
+# Time is cut into ticks of `resolution` seconds and every tick hashes to
+# one of `slots` buckets. schedule() and cancel() are O(1); advance() visits
+# only the buckets of the ticks that passed since its last call (one turn at
+# most), so a periodic tick costs O(expired + elapsed buckets) however many
+# devices are tracked. A deadline more than one turn ahead waits in its
+# bucket until its own turn comes round.
+
+
+class TimingWheel:
+    """Deadlines by key; advance(now) returns the keys that became due."""
+
+    __slots__ = ("resolution", "buckets", "ticks", "current")
+
+    def __init__(self, resolution=1.0, slots=512, now=0.0):
+        self.resolution = resolution
+        self.buckets = [set() for _ in range(slots)]
+        self.ticks = {}         # {key: tick it is due at}
+        self.current = int(now // resolution)
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def schedule(self, key, deadline):
+        """(Re)arms key; it is returned by the first advance() at or after deadline."""
+        tick = max(math.ceil(deadline / self.resolution), self.current + 1)
+        old = self.ticks.get(key)
+        if old == tick:
+            return
+        if old is not None:
+            self.buckets[old % len(self.buckets)].discard(key)
+        self.ticks[key] = tick
+        self.buckets[tick % len(self.buckets)].add(key)
+
+    def cancel(self, key):
+        tick = self.ticks.pop(key, None)
+        if tick is not None:
+            self.buckets[tick % len(self.buckets)].discard(key)
+
+    def advance(self, now):
+        target = int(now // self.resolution)
+        if target <= self.current:
+            return []
+        buckets, ticks = self.buckets, self.ticks
+        size = len(buckets)
+        due = []
+        for tick in range(self.current + 1, self.current + 1 + min(target - self.current, size)):
+            bucket = buckets[tick % size]
+            if not bucket:
+                continue
+            expired = [key for key in bucket if ticks[key] <= target]
+            for key in expired:
+                bucket.discard(key)
+                del ticks[key]
+            due.extend(expired)
+        self.current = target
+        return due
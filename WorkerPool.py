@@ -0,0 +1,204 @@
+import asyncio, csv, multiprocessing, os, queue, signal, socket, time
+
+from Collector import Collector, READINGS_HEADER, GAPS_HEADER
+from RecordLog import write_header
+from LiveFeed import open_feed
+from ServerLog import log
+from Metrics import ServerMetrics, MetricsSnapshotter, DeviceMetricsWriter
+from LoopCollector import run_loop
+from AsyncCollector import run_async
+
+
+class WorkerMetricsPublisher:
+    """Stands in for MetricsSnapshotter inside a worker: ships raw counters to the parent."""
+
+    def __init__(self, metrics, worker_index, results, interval=0.5):
+        self.metrics = metrics
+        self.worker_index = worker_index
+        self.results = results
+        self.interval = interval
+        self.last_publish = 0.0
+        self.last_published = None
+        self.publish_requested = False
+
+    def request_publish(self):
+        self.publish_requested = True
+
+    def maybe_publish(self):
+        if self.publish_requested:
+            self.publish_requested = False
+            self.publish(force=True)
+        elif time.monotonic() - self.last_publish >= self.interval:
+            self.publish()
+
+    def publish(self, force=False):
+        self.last_publish = time.monotonic()
+        if not force and self.metrics.change_marker() == self.last_published:
+            return
+        self.last_published = self.metrics.change_marker()
+        self.results.put((self.worker_index, "counters", self.metrics.counters()))
+
+
+class WorkerDeviceMetricsPublisher:
+    """Stands in for DeviceMetricsWriter inside a worker: ships its device rows to the parent."""
+
+    def __init__(self, worker_index, results, interval=5.0):
+        self.worker_index = worker_index
+        self.results = results
+        self.interval = interval
+
+    def publish(self, rows):
+        self.results.put((self.worker_index, "devices", rows))
+
+
+def _raise_exit(signum, frame):
+    raise SystemExit(0)
+
+
+def worker_main(index, workers, options, results):
+    signal.signal(signal.SIGTERM, _raise_exit)
+    # the listener thread of the parent does not survive the fork
+    log.configure(options["log_level"], options["log_rate_limits"])
+
+    metrics = ServerMetrics()
+    device_writer = None
+    if options["device_metrics_interval"]:
+        device_writer = WorkerDeviceMetricsPublisher(index, results, options["device_metrics_interval"])
+    # cProfile captures are per process: Profile.pstats -> Profile.worker0.pstats, ...
+    root, ext = os.path.splitext(options["cprofile_file"])
+    collector = Collector(
+        options["readings_file"], None, options["gaps_file"], options["log_file"],
+        flush_rows=options["flush_rows"],
+        flush_interval=options["flush_interval"],
+        durability=options["durability"],
+        heartbeat_timeout=options["heartbeat_timeout"],
+        heartbeat_type_timeouts=options["heartbeat_type_timeouts"],
+        heartbeat_dead_after=options["heartbeat_dead_after"],
+        integrity=options["integrity"],
+        seq_window=options["seq_window"],
+        history_window=options["history_window"],
+        fill=options["fill"],
+        ewma_alpha=options["ewma_alpha"],
+        max_fill_rows=options["max_fill_rows"],
+        storage=options["storage"],
+        storage_dir=options["storage_dir"],
+        segment_rows=options["segment_rows"],
+        segment_seconds=options["segment_seconds"],
+        overwrite=False,
+        id_start=index + 1, id_step=workers,
+        device_metrics_file=None,
+        device_writer=device_writer,
+        type_metrics_file=None,
+        worst_devices=options["worst_devices"],
+        profile_stages=options["profile_stages"],
+        stages_file=None,
+        cprofile_file=f"{root}.worker{index}{ext}",
+        cprofile_packets=options["cprofile_packets"],
+        cprofile_skip=options["cprofile_skip"],
+        metrics=metrics,
+        snapshotter=WorkerMetricsPublisher(metrics, index, results, options["metrics_interval"])
+    )
+
+    label = f"[WORKER {index}] pid={os.getpid()}"
+    try:
+        if options["mode"] == "asyncio":
+            asyncio.run(run_async(collector, options["host"], options["port"], reuse_port=True, label=label))
+        else:
+            run_loop(collector, options["host"], options["port"], reuse_port=True, label=label,
+                     recv_batch=options["recv_batch"])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.close()
+        log.shutdown()
+
+
+def run_workers(workers, options, metrics_file="Metrics.csv", metrics_append=False,
+                live_host="127.0.0.1", live_port=None, live_allow=("127.0.0.1",)):
+    """Starts N SO_REUSEPORT workers and merges their counters into one Metrics.csv.
+
+    The kernel hashes each sensor's address to one worker, so per-device
+    state never has to be shared; only the counters (histograms included)
+    travel to the parent, and the device rows, which are just concatenated.
+    The live feed runs in the parent and pushes the merged metrics only.
+    """
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise SystemExit("[ERROR] --workers needs SO_REUSEPORT (Linux / WSL)")
+
+    # headers once here, every worker appends whole flushes to the same files
+    files = [(options["gaps_file"], GAPS_HEADER)]
+    if "csv" in options["storage"]:
+        files.append((options["readings_file"], READINGS_HEADER))
+        print(f"[CSV] {options['readings_file']} overwritten.", flush=True)
+    for path, header in files:
+        with open(path, "w", newline='') as f:
+            csv.writer(f).writerow(header)
+    if "log" in options["storage"]:
+        write_header(options["log_file"])
+
+    results = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=worker_main, args=(i, workers, options, results), daemon=True)
+        for i in range(workers)
+    ]
+
+    merged = ServerMetrics()
+    merged.worst_k = options["worst_devices"]
+    feed = open_feed(live_host, live_port, records=False, allow=live_allow) if live_port else None
+    snapshotter = MetricsSnapshotter(merged, metrics_file,
+                                     interval=options["metrics_interval"], append=metrics_append, feed=feed,
+                                     types_path=options["type_metrics_file"],
+                                     stages_path=options["stages_file"])
+    device_writer = None
+    if options["device_metrics_interval"]:
+        device_writer = DeviceMetricsWriter(options["device_metrics_file"], options["device_metrics_interval"])
+    latest = {}
+    device_rows = {}
+
+    def drain(timeout):
+        devices_changed = False
+        try:
+            message = results.get(timeout=timeout)
+            while True:
+                index, kind, payload = message
+                if kind == "devices":
+                    device_rows[index] = payload
+                    devices_changed = True
+                else:
+                    latest[index] = payload
+                message = results.get_nowait()
+        except queue.Empty:
+            pass
+        merged.load_sum(latest.values())
+        if devices_changed and device_writer is not None:
+            device_writer.publish([row for rows in device_rows.values() for row in rows])
+
+    if hasattr(signal, "SIGUSR1"):
+        # only a flag: the loop below writes the snapshot, never the signal handler
+        signal.signal(signal.SIGUSR1, lambda signum, frame: snapshotter.request_publish())
+
+    for p in procs:
+        p.start()
+    print(f"Server started with {workers} workers on port {options['port']}", flush=True)
+
+    try:
+        while any(p.is_alive() for p in procs):
+            drain(min(snapshotter.interval, feed.tick_interval) if feed else snapshotter.interval)
+            snapshotter.maybe_publish()
+            if feed is not None:
+                feed.poll()
+        print("[SERVER ERROR] all workers exited", flush=True)
+    finally:
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+        # keep reading while they exit so no worker blocks on a full queue
+        deadline = time.monotonic() + 5
+        while any(p.is_alive() for p in procs) and time.monotonic() < deadline:
+            drain(0.1)
+        for p in procs:
+            p.join(timeout=1)
+        drain(0.1)
+        snapshotter.publish(force=True)
+        if feed is not None:
+            feed.close()
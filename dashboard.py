@@ -1,14 +1,19 @@
 import customtkinter as ctk
-import subprocess, threading, time, os, sys, pandas as pd
+import subprocess, threading, time, os, sys, queue, socket, pandas as pd
+import tkinter as tk
 from tkinter import messagebox, ttk
 import re
 import shutil
+from collections import deque
+from RecordLog import read_records, record_count, record_label, FLAG_DUPLICATE, FLAG_LOSS
+from LiveFeed import LiveFeedClient
+from Series import SeriesStore, ALL
 
 PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
 LOGS_DIR = os.path.join(PROJECT_DIR, "Logs")
 os.makedirs(LOGS_DIR, exist_ok=True)
 
-SENSORS_LOG = os.path.join(PROJECT_DIR, "SensorsLogs.csv")
+READINGS_LOG = os.path.join(PROJECT_DIR, "Readings.log")
 METRICS_CSV = os.path.join(PROJECT_DIR, "Metrics.csv")
 
 SENSORS = {
@@ -22,6 +27,18 @@ running_counts = {name: 0 for name in SENSORS}
 log_counters = {"Temperature": 0, "Humidity": 0, "Pressure": 0}
 
 REFRESH_MS = 600
+LIVE_MS = 50
+LIVE_PORT = 9998
+TABLE_ROWS = 12
+DEVICE_SCAN_MAX = 4096      # newest records scanned per refresh for the per-device view
+
+# chart label -> series metric; "All" loss comes from the Metrics snapshots, a device's
+# loss from its ESTIMATED records (none with --fill none)
+CHART_METRICS = {"Value": "value", "Delay (ms)": "delay", "Interval (ms)": "interval", "Loss %": "loss"}
+CHART_BUCKETS = 120         # x 1 s buckets = last 2 minutes
+TERMINAL_MS = 100
+# lines kept in the server terminal, older ones are trimmed
+TERMINAL_SCROLLBACK = int(os.environ.get("DASHBOARD_SCROLLBACK", "2000"))
 ansi_escape = re.compile(r'\x1b[^m]*m')
 
 
@@ -77,6 +94,18 @@ def spawn_process(cmd_list, tag):
     return p, logfile
 
 
+def local_address(server_ip):
+    """Source address this machine uses to reach server_ip: the only one the live feed lets subscribe."""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.connect((server_ip, LIVE_PORT))     # UDP connect only picks the route, nothing is sent
+        return s.getsockname()[0]
+    except OSError:
+        return "127.0.0.1"
+    finally:
+        s.close()
+
+
 def stop_process(tag):
     item = processes.get(tag)
     if not item:
@@ -122,8 +151,30 @@ class Dashboard(ctk.CTk):
         self.timer_popup_shown = False
         self.remaining_time = 0
 
+        # live push channel from the server; files are only polled while it is silent
+        self.live = None
+        self.live_records_at = 0.0
+
+        # what the tables already show: Readings.log records read so far (None = resync
+        # without reading, after the live feed showed them), metrics file stamp, device rows
+        self.log_seen = 0
+        self.metrics_stamp = None
+        self.device_rows = {}       # {dev_id: (tree item, shown values)}
+
+        # chart data: fixed-size downsampled series per (metric, device)
+        self.series = SeriesStore(CHART_BUCKETS, 1.0)
+        self.series_arrivals = {}   # {dev_id: arrival ms of its last packet}
+        self.chart_drawn = None
+        self.chart_devices = [ALL]
+
+        # server output lines from the capture thread, drained by the Tk loop
+        self.terminal_queue = queue.SimpleQueue()
+        self.terminal_lines = 0
+
         self.build_ui()
         self.after(REFRESH_MS, self.refresh_dashboard)
+        self.after(LIVE_MS, self.poll_live)
+        self.after(TERMINAL_MS, self.drain_terminal)
 
         self.protocol("WM_DELETE_WINDOW", self.on_close)
 
@@ -241,6 +292,35 @@ class Dashboard(ctk.CTk):
             self.tree.column(c, anchor="center", width=120)
         self.tree.pack(fill="x", padx=10, pady=10)
 
+        device_card = ctk.CTkFrame(right)
+        device_card.pack(fill="x", padx=10, pady=10)
+        ctk.CTkLabel(device_card, text="Latest by Device",
+                     font=("Segoe UI", 20, "bold")).pack(anchor="w", padx=10, pady=10)
+
+        device_cols = ["ID", "Sensor Type", "Seq", "Value", "Msg Type", "Arrival"]
+        self.device_tree = ttk.Treeview(device_card, columns=device_cols, show="headings", height=6)
+        for c in device_cols:
+            self.device_tree.heading(c, text=c)
+            self.device_tree.column(c, anchor="center", width=120)
+        self.device_tree.pack(fill="x", padx=10, pady=10)
+
+        chart_card = ctk.CTkFrame(right)
+        chart_card.pack(fill="x", padx=10, pady=10)
+        chart_head = ctk.CTkFrame(chart_card, fg_color="transparent")
+        chart_head.pack(fill="x", padx=10, pady=10)
+        ctk.CTkLabel(chart_head, text="Live Chart",
+                     font=("Segoe UI", 20, "bold")).pack(side="left")
+        self.chart_device_var = ctk.StringVar(value=ALL)
+        self.chart_device_menu = ctk.CTkOptionMenu(chart_head, variable=self.chart_device_var, values=[ALL],
+                                                   width=100)
+        self.chart_device_menu.pack(side="right", padx=5)
+        self.chart_metric_var = ctk.StringVar(value="Delay (ms)")
+        ctk.CTkOptionMenu(chart_head, variable=self.chart_metric_var, values=list(CHART_METRICS),
+                          width=140).pack(side="right", padx=5)
+
+        self.chart = tk.Canvas(chart_card, height=180, bg="#1a1a1a", highlightthickness=0)
+        self.chart.pack(fill="x", padx=10, pady=(0, 10))
+
         term_card = ctk.CTkFrame(right)
         term_card.pack(fill="both", expand=True, padx=10, pady=10)
         ctk.CTkLabel(term_card, text="Server Terminal",
@@ -306,6 +386,7 @@ class Dashboard(ctk.CTk):
         self.terminal.configure(state="normal")
         self.terminal.delete("1.0", "end")
         self.terminal.configure(state="disabled")
+        self.terminal_lines = 0
 
         try:
             shutil.rmtree(LOGS_DIR)
@@ -328,8 +409,17 @@ class Dashboard(ctk.CTk):
             messagebox.showerror("Error", "Enter valid test time.")
             return
 
-        p, logfile = spawn_process(["wsl", "python3", "Server.py"], "SERVER")
+        # the feed binds to the WSL address the dashboard reaches and only serves this machine
+        server_ip = self.server_ip_var.get().strip() or "127.0.0.1"
+        p, logfile = spawn_process(["wsl", "python3", "Server.py", "--live-host", server_ip,
+                                    "--live-allow", local_address(server_ip),
+                                    "--live-port", str(LIVE_PORT)], "SERVER")
         self.server_running = True
+
+        if self.live is not None:
+            self.live.close()
+        self.clear_tables()
+        self.live = LiveFeedClient(server_ip, LIVE_PORT)
         self.start_server_btn.configure(state="disabled")
 
         threading.Thread(target=self.capture_terminal, args=("SERVER", p, logfile), daemon=True).start()
@@ -338,13 +428,15 @@ class Dashboard(ctk.CTk):
         self.start_countdown(int(self.test_time_var.get()))
 
     def capture_terminal(self, tag, p, logfile):
+        """Background thread: copies a process's output to its log file.
 
+        Server lines are only queued here; the Tk main loop inserts them in
+        drain_terminal(), widgets are never touched from this thread.
+        """
         show_output = (tag == "SERVER")  # Only display server logs in UI terminal
 
         try:
             for line in iter(p.stdout.readline, ''):
-                if line == '':
-                    break
                 clean = ansi_escape.sub("", line)
 
                 try:
@@ -354,48 +446,34 @@ class Dashboard(ctk.CTk):
                     pass
 
                 if show_output:
-                    try:
-                        self.terminal.configure(state="normal")
-                        self.terminal.insert("end", clean)
-                        self.terminal.see("end")
-                        self.terminal.configure(state="disabled")
-                    except:
-                        pass
-
+                    self.terminal_queue.put(clean)
         except:
             pass
-        finally:
-            try:
-                logfile.flush()
-            except:
-                pass
 
+    def drain_terminal(self):
+        # everything queued since the last tick goes in with one insert; under a burst only
+        # the newest TERMINAL_SCROLLBACK lines could stay visible anyway
+        lines = deque(maxlen=TERMINAL_SCROLLBACK)
+        try:
+            while True:
+                lines.append(self.terminal_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        if lines:
             try:
-                for line in iter(p.stdout.readline, ''):
-                    if line == '':
-                        break
-                    clean = ansi_escape.sub("", line)
-
-                    try:
-                        logfile.write(clean)
-                        logfile.flush()
-                    except:
-                        pass
-
-                    try:
-                        self.terminal.configure(state="normal")
-                        self.terminal.insert("end", clean)
-                        self.terminal.see("end")
-                        self.terminal.configure(state="disabled")
-                    except:
-                        pass
+                self.terminal.configure(state="normal")
+                self.terminal.insert("end", "".join(lines))
+                self.terminal_lines += len(lines)
+                excess = self.terminal_lines - TERMINAL_SCROLLBACK
+                if excess > 0:
+                    self.terminal.delete("1.0", f"{excess + 1}.0")
+                    self.terminal_lines -= excess
+                self.terminal.see("end")
+                self.terminal.configure(state="disabled")
             except:
                 pass
-            finally:
-                try:
-                    logfile.flush()
-                except:
-                    pass
+        self.after(TERMINAL_MS, self.drain_terminal)
 
     # ------------------------------- SENSORS -------------------------------
 
@@ -462,6 +540,10 @@ class Dashboard(ctk.CTk):
         self.server_running = False
         self.start_server_btn.configure(state="normal")
 
+        if self.live is not None:
+            self.live.close()
+            self.live = None
+
     def clear_logs(self):
         try:
             shutil.rmtree(LOGS_DIR)
@@ -474,38 +556,193 @@ class Dashboard(ctk.CTk):
 
     # ------------------------------- LIVE DASHBOARD -------------------------------
 
+    def poll_live(self):
+        if self.live is not None:
+            try:
+                metrics, records = self.live.poll()
+                if metrics:
+                    self.show_metrics(metrics)
+                if records:
+                    self.live_records_at = time.monotonic()
+                    self.log_seen = None
+                    self.add_records(records)
+            except:
+                pass
+        self.after(LIVE_MS, self.poll_live)
+
     def refresh_dashboard(self):
-        self.update_table()
-        self.update_metrics()
+        # fallback for a server that was not started from here (no live feed frames);
+        # a --workers server pushes metrics only, its readings still come from Readings.log
+        live = self.live is not None and self.live.connected()
+        if not live:
+            self.update_metrics()
+        if not live or time.monotonic() - self.live_records_at > 2:
+            self.update_table()
+        try:
+            self.draw_chart()
+        except:
+            pass
         self.after(REFRESH_MS, self.refresh_dashboard)
 
     def update_metrics(self):
-        if not os.path.exists(METRICS_CSV):
+        try:
+            st = os.stat(METRICS_CSV)
+        except OSError:
+            return
+        # the snapshotter replaces the file only when something changed
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self.metrics_stamp:
             return
         try:
             df = pd.read_csv(METRICS_CSV)
-            row = df.iloc[-1]
-            for k, lbl in self.metric_labels.items():
-                lbl.configure(text=str(row.get(k, "")))
+            self.show_metrics(df.iloc[-1])
+            self.metrics_stamp = stamp
         except:
             pass
 
-    def update_table(self):
-        for x in self.tree.get_children():
-            self.tree.delete(x)
+    def show_metrics(self, row):
+        for k, lbl in self.metric_labels.items():
+            lbl.configure(text=str(row.get(k, "")))
+        try:
+            self.series.add("loss", ALL, time.time(), float(row.get("packet_loss_percent", 0)))
+        except (TypeError, ValueError):
+            pass
 
-        if not os.path.exists(SENSORS_LOG):
+    # ------------------------------- CHARTS -------------------------------
+
+    def feed_series(self, records):
+        add = self.series.add
+        arrivals = self.series_arrivals
+        for r in records:
+            t = r.arrival / 1000
+            if r.flags & FLAG_LOSS:
+                # one ESTIMATED record per missing packet: 100 for a lost packet, 0 for a
+                # received one, so the bucket mean is the device's loss % over that second
+                add("loss", r.dev_id, t, 100.0)
+                continue    # estimated, not measured
+            if r.value == r.value:
+                add("value", r.dev_id, t, r.value)
+            if r.index:
+                continue    # delay / interval once per packet, not per batch value
+            if not r.flags & FLAG_DUPLICATE:
+                add("loss", r.dev_id, t, 0.0)
+            delay = r.arrival - r.timestamp
+            add("delay", r.dev_id, t, delay)
+            add("delay", ALL, t, delay)
+            last = arrivals.get(r.dev_id)
+            if last is not None and r.arrival >= last:
+                add("interval", r.dev_id, t, r.arrival - last)
+                add("interval", ALL, t, r.arrival - last)
+            arrivals[r.dev_id] = r.arrival
+
+    def draw_chart(self):
+        metric = CHART_METRICS[self.chart_metric_var.get()]
+        device = self.chart_device_var.get()
+        if device != ALL:
+            device = int(device)
+        series = self.series.get(metric, device)
+
+        devices = [ALL] + [str(d) for d in self.series.devices()]
+        if devices != self.chart_devices:
+            self.chart_devices = devices
+            self.chart_device_menu.configure(values=devices)
+
+        # nothing changed since the last draw -> keep the canvas as it is
+        width, height = self.chart.winfo_width(), self.chart.winfo_height()
+        state = (metric, device, series.changes if series else -1, width, height)
+        if state == self.chart_drawn:
             return
+        self.chart_drawn = state
+
+        c = self.chart
+        c.delete("all")
+        points = series.points() if series else []
+        if not points:
+            c.create_text(width / 2, height / 2, fill="gray",
+                          text="pick a device" if metric == "value" and device == ALL else "no data yet")
+            return
+
+        pad = 30
+        t0, t1 = points[0][0], max(points[-1][0], points[0][0] + 1)
+        lo = min(p[1] for p in points)
+        hi = max(p[2] for p in points)
+        if hi == lo:
+            hi, lo = hi + 1, lo - 1
+
+        def x(t):
+            return pad + (t - t0) / (t1 - t0) * (width - 2 * pad)
+
+        def y(v):
+            return height - pad / 2 - (v - lo) / (hi - lo) * (height - pad)
+
+        # min / max band of every bucket, mean line on top: at most CHART_BUCKETS points
+        band = [coord for p in points for coord in (x(p[0]), y(p[2]))]
+        band += [coord for p in reversed(points) for coord in (x(p[0]), y(p[1]))]
+        if len(points) > 1:
+            c.create_polygon(band, fill="#24415e", outline="")
+            c.create_line([coord for p in points for coord in (x(p[0]), y(p[3]))], fill="#3A8DFF", width=2)
+        else:
+            c.create_line(x(t0), y(points[0][1]), x(t0), y(points[0][2]), fill="#3A8DFF", width=3)
+        c.create_text(4, pad / 2, anchor="w", fill="white", text=f"{hi:.2f}")
+        c.create_text(4, height - pad / 2, anchor="w", fill="white", text=f"{lo:.2f}")
+        c.create_text(width - 4, pad / 2, anchor="e", fill="#3A8DFF", text=f"mean {points[-1][3]:.2f}")
 
+    def update_table(self):
+        # Readings.log record count is the change counter: nothing new -> no widget work at all
+        count = record_count(READINGS_LOG)
+        if self.log_seen is None:
+            # the live feed already showed these records
+            self.log_seen = count
+            return
+        if count == self.log_seen:
+            return
+        if count < self.log_seen:
+            # the server restarted and truncated the log
+            self.clear_tables()
         try:
-            df = pd.read_csv(SENSORS_LOG).tail(12)
-            df = df.where(pd.notnull(df), "")
-            cols = self.tree["columns"]
-            for _, row in df.iterrows():
-                self.tree.insert("", "end", values=[row.get(c, "") for c in cols])
+            records = read_records(READINGS_LOG, max(self.log_seen, count - DEVICE_SCAN_MAX), count)
+            self.log_seen = count
+            self.add_records(records)
         except:
             pass
 
+    def clear_tables(self):
+        self.tree.delete(*self.tree.get_children())
+        self.device_tree.delete(*self.device_tree.get_children())
+        self.device_rows.clear()
+        self.log_seen = 0
+        self.series.clear()
+        self.series_arrivals.clear()
+
+    def add_records(self, records):
+        """Appends only the new rows, evicts the oldest beyond TABLE_ROWS and updates the device view."""
+        self.feed_series(records)
+        for r in records[-TABLE_ROWS:]:
+            cells = ["", "", ""]
+            if r.value == r.value and r.sensor_type < 3:   # NaN for INIT / HEARTBEAT
+                cells[r.sensor_type] = f"{r.value:.2f}"
+            self.tree.insert("", "end", values=[
+                r.sensor_type, r.dev_id, r.seq, r.timestamp, f"{r.arrival / 1000:.3f}",
+                record_label(r), cells[0], cells[1], cells[2],
+                bool(r.flags & FLAG_DUPLICATE), r.count
+            ])
+        rows = self.tree.get_children()
+        if len(rows) > TABLE_ROWS:
+            self.tree.delete(*rows[:len(rows) - TABLE_ROWS])
+
+        latest = {}
+        for r in records:
+            latest[r.dev_id] = r
+        for dev_id, r in latest.items():
+            values = (dev_id, r.sensor_type, r.seq, f"{r.value:.2f}" if r.value == r.value else "",
+                      record_label(r), f"{r.arrival / 1000:.3f}")
+            row = self.device_rows.get(dev_id)
+            if row is None:
+                self.device_rows[dev_id] = (self.device_tree.insert("", "end", values=values), values)
+            elif row[1] != values:
+                self.device_tree.item(row[0], values=values)
+                self.device_rows[dev_id] = (row[0], values)
+
     # ------------------------------- WINDOW CLOSE -------------------------------
 
     def on_close(self):
@@ -1,6 +1,14 @@
 #!/usr/bin/env bash
 set -e
 
+# Unprivileged variant: bash run_baseline_test.sh --proxy
+# (sensors send to port 9000, e.g. python3 TemperatureSensor.py --server-port 9000)
+if [ "$1" = "--proxy" ]; then
+    echo "[BASELINE] no loss, no delay, no jitter through ImpairmentProxy on port 9000 for 60 seconds."
+    python3 ImpairmentProxy.py --listen-port 9000 --seed "${SEED:-1}" --duration 60 --report 10
+    exit 0
+fi
+
 # Reset network conditions
 sudo tc qdisc del dev lo root 2>/dev/null || true
 echo "[BASELINE] Network reset: no loss, no delay, no jitter."
@@ -1,6 +1,14 @@
 #!/usr/bin/env bash
 set -e
 
+# Unprivileged variant: bash run_delay_test.sh --proxy
+# (sensors send to port 9000, e.g. python3 TemperatureSensor.py --server-port 9000)
+if [ "$1" = "--proxy" ]; then
+    echo "[DELAY TEST] 100ms delay with ±10ms jitter through ImpairmentProxy on port 9000 for 60 seconds."
+    python3 ImpairmentProxy.py --listen-port 9000 --delay 100 --jitter 10 --seed "${SEED:-1}" --duration 60 --report 10
+    exit 0
+fi
+
 # Clear old settings
 sudo tc qdisc del dev lo root 2>/dev/null || true
 
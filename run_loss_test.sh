@@ -1,6 +1,14 @@
 #!/usr/bin/env bash
 set -e
 
+# Unprivileged variant: bash run_loss_test.sh --proxy
+# (sensors send to port 9000, e.g. python3 TemperatureSensor.py --server-port 9000)
+if [ "$1" = "--proxy" ]; then
+    echo "[LOSS TEST] 5% packet loss through ImpairmentProxy on port 9000 for 60 seconds."
+    python3 ImpairmentProxy.py --listen-port 9000 --loss 5 --seed "${SEED:-1}" --duration 60 --report 10
+    exit 0
+fi
+
 # Clear old settings
 sudo tc qdisc del dev lo root 2>/dev/null || true
 
@@ -22,4 +30,4 @@ sleep 60
 echo "[CAPTURE] Stopping capture..."
 sudo kill "$TCPDUMP_PID" 2>/dev/null || true
 
-echo "[CAPTURE] Saved as $OUTPUT"
\ No newline at end of file
+echo "[CAPTURE] Saved as $OUTPUT"
@@ -0,0 +1,71 @@
+import random
+
+from Breakdown import CounterTable, TopK
+
+
+def full_sort(scores, k):
+    # highest score first, ties by key, as the heap orders them
+    ranked = sorted(scores.items(), key=lambda item: (tuple(-s for s in item[1]), item[0]))
+    return [(score, key) for key, score in ranked[:k]]
+
+
+# ------ TopK ------
+def test_top_matches_a_full_sort_after_random_updates():
+    rng = random.Random(3)
+    top, scores = TopK(), {}
+    for step in range(5000):
+        key = rng.randrange(200)
+        # few distinct scores, so ties between keys are common
+        score = (rng.randrange(20) / 2, rng.randrange(5))
+        top.update(key, score)
+        scores[key] = score
+        if step % 97 == 0:
+            for k in (1, 5, 50, 500):
+                assert top.top(k) == full_sort(scores, k)
+    assert top.top(10) == full_sort(scores, 10)
+
+
+def test_heap_is_rebuilt_when_stale_entries_pile_up():
+    top = TopK()
+    for i in range(1000):
+        top.update("a", (i,))
+        top.update("b", (1000 - i,))
+    assert len(top.heap) <= 2 * len(top.scores) + 64
+    assert top.top(2) == [((999,), "a"), ((1,), "b")]
+
+
+def test_top_can_be_called_again():
+    top = TopK()
+    for key in range(10):
+        top.update(key, (key,))
+    first = top.top(3)
+    assert first == top.top(3) == [((9,), 9), ((8,), 8), ((7,), 7)]
+
+
+# ------ CounterTable ------
+def test_worst_matches_a_full_sort_of_the_rows():
+    rng = random.Random(5)
+    table = CounterTable()
+    for step in range(3000):
+        row = table.row(rng.randrange(300))
+        if rng.random() < 0.1:
+            table.lost[row] += rng.randrange(1, 4)
+        else:
+            table.received[row] += 1
+        table.touched.add(row)
+        if step % 250 == 0:
+            expected = sorted(((table.loss_percent(r), table.lost[r], table.keys[r]) for r in range(len(table))
+                               if table.lost[r] > 0), key=lambda t: (-t[0], -t[1], table.index[t[2]]))
+            assert table.worst(10) == expected[:10]
+
+
+def test_rows_are_stable_and_merge_adds_counts():
+    a, b = CounterTable(), CounterTable()
+    a.received[a.row(7)] += 3
+    b.received[b.row(9)] += 1
+    b.received[b.row(7)] += 2
+    b.lost[b.row(7)] += 1
+    assert a.row(7) == 0
+    a.merge_state(b.state())
+    assert a.summary(a.row(7))[:3] == [5, 1, round(1 / 6 * 100, 3)]
+    assert a.received[a.row(9)] == 1
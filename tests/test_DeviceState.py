@@ -0,0 +1,50 @@
+import statistics
+
+from DeviceState import DeviceState
+
+
+def device():
+    return DeviceState(1, 0, 1)
+
+
+# ------ running mean ------
+def test_no_values_is_zero():
+    assert device().moving_average() == 0
+    assert device().last_value() is None
+
+
+def test_partly_filled_window():
+    state = device()
+    state.add_values([1.0, 2.0, 4.0], 8)
+    assert state.moving_average() == statistics.mean([1.0, 2.0, 4.0])
+    assert state.last_value() == 4.0
+
+
+def test_running_sum_matches_the_window_after_many_laps():
+    state = device()
+    window = 7
+    values = [(i * 37 % 101) / 3 + 0.1 for i in range(1000)]
+    for start in range(0, len(values), 3):
+        state.add_values(values[start:start + 3], window)
+        seen = values[:start + 3]
+        assert abs(state.moving_average() - statistics.mean(seen[-window:])) < 1e-9
+    assert state.last_value() == values[-1]
+
+
+def test_running_sum_does_not_drift():
+    state = device()
+    # large and small values mixed: without the per-lap resync the sum keeps their rounding error
+    values = [1e12 if i % 2 else 1e-3 for i in range(100001)]
+    for v in values:
+        state.add_values((v,), 16)
+    expected = statistics.mean(values[-16:])
+    assert abs(state.moving_average() - expected) <= expected * 1e-12
+
+
+# ------ ewma ------
+def test_ewma_starts_at_the_first_value():
+    state = device()
+    state.add_ewma([10.0], 0.5)
+    assert state.ewma == 10.0
+    state.add_ewma([20.0, 20.0], 0.5)
+    assert state.ewma == 17.5
@@ -0,0 +1,91 @@
+import math, random
+
+import pytest
+
+from Histogram import Histogram, PERCENTILES
+
+
+def exact_percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(len(ordered) * p / 100)) - 1]
+
+
+def samples(n=20000, seed=1):
+    rng = random.Random(seed)
+    # several decades, like delays in ms or processing times in us
+    return [int(rng.lognormvariate(6, 2)) for _ in range(n)]
+
+
+# ------ percentile error bound ------
+@pytest.mark.parametrize("sub_bits", [5, 7])
+def test_percentiles_within_the_relative_error_bound(sub_bits):
+    values = samples()
+    hist = Histogram(sub_bits)
+    for v in values:
+        hist.record(v)
+    bound = 1 / 2 ** (sub_bits - 1)
+    ps = (0, 25, 50, 75, 90, 99, 99.9, 100)     # percentiles() walks the buckets once: ascending
+    for p, estimate in zip(ps, hist.percentiles(ps)):
+        exact = exact_percentile(values, p)
+        assert abs(estimate - exact) <= exact * bound, (p, estimate, exact)
+        assert estimate == hist.percentile(p)
+
+
+def test_small_values_are_exact():
+    hist = Histogram(7)
+    values = list(range(64)) * 3
+    for v in values:
+        hist.record(v)
+    for p in (1, 50, 90, 99):
+        assert hist.percentile(p) == exact_percentile(values, p)
+
+
+def test_count_sum_min_max_are_exact():
+    values = samples(1000)
+    hist = Histogram(5)
+    for v in values:
+        hist.record(v)
+    assert hist.count == len(values)
+    assert hist.total == sum(values)
+    assert (hist.min, hist.max) == (min(values), max(values))
+    assert hist.mean() == sum(values) / len(values)
+
+
+def test_negative_values_count_as_zero():
+    hist = Histogram()
+    hist.record(-5)
+    assert (hist.min, hist.max, hist.total) == (0, 0, 0)
+
+
+def test_empty():
+    hist = Histogram()
+    assert hist.percentile(50) == 0
+    assert hist.percentiles() == [0] * len(PERCENTILES)
+    assert hist.mean() == 0
+
+
+# ------ merging ------
+def test_merge_equals_one_histogram_of_everything():
+    values = samples()
+    whole, left, right = Histogram(5), Histogram(5), Histogram(5)
+    for i, v in enumerate(values):
+        whole.record(v)
+        (left if i % 3 else right).record(v)
+    left.merge(right)
+    assert left.state() == whole.state()
+    assert left.percentiles() == whole.percentiles()
+
+
+def test_merge_into_empty_and_from_empty():
+    full = Histogram()
+    full.record(10)
+    empty = Histogram()
+    empty.merge(full)
+    assert empty.state() == full.state()
+    full.merge(Histogram())
+    assert (full.count, full.min, full.max) == (1, 10, 10)
+
+
+def test_merge_refuses_different_resolutions():
+    with pytest.raises(ValueError):
+        Histogram(5).merge(Histogram(7))
@@ -0,0 +1,81 @@
+import math
+
+import pytest
+
+from RecordLog import (RecordLogWriter, FLAG_LOSS, FLAG_DUPLICATE, read_records, record_count, record_label,
+                       tail, iter_records)
+
+
+def write(path, n, flush_rows=7, overwrite=True):
+    writer = RecordLogWriter(str(path), flush_rows=flush_rows, flush_interval=3600, overwrite=overwrite)
+    for seq in range(n):
+        writer.write_values(0, 1, seq, 1, 1000 + seq, 2000 + seq, (float(seq),))
+    writer.close()
+
+
+# ------ tail reads ------
+def test_tail_after_many_flushes(tmp_path):
+    path = tmp_path / "Readings.log"
+    write(path, 100)
+    assert record_count(str(path)) == 100
+    assert [r.seq for r in tail(str(path), 5)] == [95, 96, 97, 98, 99]
+    assert [r.value for r in tail(str(path), 1)] == [99.0]
+
+
+def test_tail_longer_than_the_log(tmp_path):
+    path = tmp_path / "Readings.log"
+    write(path, 3)
+    assert [r.seq for r in tail(str(path), 10)] == [0, 1, 2]
+    assert tail(str(path), 0) == []
+
+
+def test_read_records_ranges(tmp_path):
+    path = tmp_path / "Readings.log"
+    write(path, 20)
+    assert [r.seq for r in read_records(str(path), 5, 8)] == [5, 6, 7]
+    assert [r.seq for r in read_records(str(path), -3)] == [17, 18, 19]
+    assert [r.seq for r in read_records(str(path), -3, -1)] == [17, 18]
+    assert read_records(str(path), 30) == []
+    assert [r.seq for r in iter_records(str(path), chunk=6)] == list(range(20))
+
+
+def test_restart_truncates_and_append_keeps(tmp_path):
+    path = tmp_path / "Readings.log"
+    write(path, 10)
+    write(path, 4, overwrite=False)
+    assert record_count(str(path)) == 14
+    write(path, 2)
+    assert [r.seq for r in tail(str(path), 5)] == [0, 1]
+
+
+def test_missing_or_foreign_file(tmp_path):
+    assert record_count(str(tmp_path / "none.log")) == 0
+    assert read_records(str(tmp_path / "none.log")) == []
+    other = tmp_path / "other.log"
+    other.write_bytes(b"x" * 200)
+    with pytest.raises(ValueError):
+        read_records(str(other))
+
+
+# ------ record contents ------
+def test_estimated_seqs_wrap_at_65535(tmp_path):
+    path = tmp_path / "Readings.log"
+    writer = RecordLogWriter(str(path))
+    writer.write_estimated(0, 4, 65534, 1000, 2000, [1.0, 2.0, 3.0, 4.0])
+    writer.close()
+    records = tail(str(path), 4)
+    assert [r.seq for r in records] == [65534, 65535, 0, 1]
+    assert all(r.flags & FLAG_LOSS and record_label(r) == "ESTIMATED" for r in records)
+
+
+def test_batch_heartbeat_and_duplicate_records(tmp_path):
+    path = tmp_path / "Readings.log"
+    writer = RecordLogWriter(str(path))
+    writer.write_values(1, 2, 10, 1, 1000, 2000, (1.5, 2.5, 3.5))
+    writer.write_values(1, 2, 11, 2, 1001, 2001, ())
+    writer.write_values(1, 2, 10, 1, 1000, 2002, (1.5,), duplicate=True)
+    writer.close()
+    batch, heartbeat, duplicate = tail(str(path), 5)[:3], tail(str(path), 2)[0], tail(str(path), 1)[0]
+    assert [(r.index, r.count, r.value) for r in batch] == [(0, 3, 1.5), (1, 3, 2.5), (2, 3, 3.5)]
+    assert record_label(heartbeat) == "HEARTBEAT" and math.isnan(heartbeat.value)
+    assert duplicate.flags & FLAG_DUPLICATE and duplicate.arrival == 2002
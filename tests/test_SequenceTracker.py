@@ -0,0 +1,94 @@
+from SequenceTracker import (SequenceTracker, SEQ_MODULUS, SEQ_HALF, IN_ORDER, GAP, DUPLICATE, LATE, STALE,
+                             next_seq)
+
+
+def feed(tracker, seqs):
+    return [tracker.classify(seq) for seq in seqs]
+
+
+# ------ 16-bit wraparound ------
+def test_next_seq_wraps():
+    assert next_seq(SEQ_MODULUS - 1) == 0
+    assert next_seq(41) == 42
+
+
+def test_65535_to_0_is_in_order():
+    tracker = SequenceTracker(65535)
+    assert tracker.classify(0) == (IN_ORDER, 0)
+    assert tracker.highest == 0
+    assert tracker.classify(1) == (IN_ORDER, 0)
+
+
+def test_gap_across_the_wrap():
+    tracker = SequenceTracker(65534)
+    # 65535 and 0 skipped
+    assert tracker.classify(1) == (GAP, 2)
+
+
+def test_late_arrivals_across_the_wrap():
+    tracker = SequenceTracker(65534)
+    tracker.classify(1)
+    assert tracker.classify(65535) == (LATE, 2)
+    assert tracker.classify(0) == (LATE, 1)
+    assert tracker.classify(0) == (DUPLICATE, 1)
+    assert tracker.classify(2) == (IN_ORDER, 0)
+
+
+def test_half_the_sequence_space_back_is_behind_not_ahead():
+    tracker = SequenceTracker(40000)
+    assert tracker.classify((40000 + SEQ_HALF) % SEQ_MODULUS) == (STALE, SEQ_HALF)
+    assert tracker.highest == 40000
+    assert tracker.classify((40000 + SEQ_HALF - 1) % SEQ_MODULUS) == (GAP, SEQ_HALF - 2)
+
+
+# ------ duplicates and late arrivals inside the window ------
+def test_repeat_of_highest_is_duplicate():
+    tracker = SequenceTracker(7)
+    assert tracker.classify(7) == (DUPLICATE, 0)
+
+
+def test_late_arrival_fills_its_hole_once():
+    tracker = SequenceTracker(100, window=8)
+    assert tracker.classify(105) == (GAP, 4)
+    assert tracker.classify(103) == (LATE, 2)
+    assert tracker.classify(103) == (DUPLICATE, 2)
+    assert tracker.classify(101) == (LATE, 4)
+    assert tracker.classify(100) == (DUPLICATE, 5)
+
+
+def test_reordered_run_is_all_late_then_in_order():
+    tracker = SequenceTracker(0, window=16)
+    results = feed(tracker, [1, 5, 4, 3, 2, 6])
+    assert results == [(IN_ORDER, 0), (GAP, 3), (LATE, 1), (LATE, 2), (LATE, 3), (IN_ORDER, 0)]
+
+
+def test_jump_longer_than_the_window_clears_the_bitmap():
+    tracker = SequenceTracker(0, window=8)
+    assert tracker.classify(20) == (GAP, 19)
+    assert tracker.bitmap == 1
+    # 15 was counted lost by the jump and is still inside the window
+    assert tracker.classify(15) == (LATE, 5)
+
+
+# ------ arrivals older than the window ------
+def test_behind_the_window_is_stale():
+    tracker = SequenceTracker(100, window=8)
+    feed(tracker, range(101, 121))
+    assert tracker.classify(113) == (DUPLICATE, 7)
+    assert tracker.classify(112) == (STALE, 8)
+    assert tracker.classify(100) == (STALE, 20)
+
+
+def test_before_the_first_seq_is_stale_until_the_window_fills():
+    tracker = SequenceTracker(100, window=256)
+    tracker.classify(101)
+    # 99 was never covered by the bitmap: late or duplicate can't be told apart
+    assert tracker.classify(99) == (STALE, 2)
+
+
+def test_window_edge_across_the_wrap():
+    tracker = SequenceTracker(65530, window=8)
+    feed(tracker, [65531, 65532, 65533, 65534, 65535, 0, 1, 2])
+    assert tracker.highest == 2
+    assert tracker.classify(65531) == (DUPLICATE, 7)
+    assert tracker.classify(65530) == (STALE, 8)
@@ -0,0 +1,79 @@
+import random
+
+from Series import DownsampledSeries, SeriesStore, ALL
+
+
+def reference(samples, bucket_seconds, buckets):
+    """(start, min, max, mean) per bucket from the raw samples, last `buckets` buckets only."""
+    groups = {}
+    for t, v in samples:
+        groups.setdefault(int(t // bucket_seconds), []).append(v)
+    latest = max(groups)
+    return [(epoch * bucket_seconds, min(vs), max(vs), sum(vs) / len(vs))
+            for epoch, vs in sorted(groups.items()) if epoch > latest - buckets]
+
+
+def close(points, expected):
+    assert len(points) == len(expected)
+    for got, want in zip(points, expected):
+        assert got[:3] == want[:3]
+        assert abs(got[3] - want[3]) < 1e-9
+
+
+# ------ downsampling ------
+def test_buckets_fold_min_max_mean():
+    series = DownsampledSeries(buckets=10, bucket_seconds=1.0)
+    for t, v in ((100.0, 5.0), (100.5, 1.0), (100.9, 3.0), (101.2, 7.0)):
+        series.add(t, v)
+    assert series.points() == [(100.0, 1.0, 5.0, 3.0), (101.0, 7.0, 7.0, 7.0)]
+
+
+def test_matches_the_raw_samples_over_many_laps():
+    rng = random.Random(7)
+    series = DownsampledSeries(buckets=12, bucket_seconds=0.5)
+    samples = []
+    t = 1000.0
+    for _ in range(5000):
+        t += rng.random() * 0.05
+        v = rng.uniform(-10, 10)
+        series.add(t, v)
+        samples.append((t, v))
+    close(series.points(), reference(samples, 0.5, 12))
+
+
+def test_empty_buckets_are_skipped():
+    series = DownsampledSeries(buckets=10)
+    series.add(1000.0, 1.0)
+    series.add(1004.0, 2.0)
+    assert [p[0] for p in series.points()] == [1000.0, 1004.0]
+
+
+def test_samples_older_than_the_window_are_dropped():
+    series = DownsampledSeries(buckets=5)
+    series.add(1010.0, 1.0)
+    changes = series.changes
+    series.add(1005.0, 99.0)        # 5 buckets back: out of the window
+    assert series.changes == changes
+    assert series.points() == [(1010.0, 1.0, 1.0, 1.0)]
+    series.add(1006.0, 2.0)         # still inside
+    assert series.points()[0] == (1006.0, 2.0, 2.0, 2.0)
+
+
+def test_times_near_zero():
+    series = DownsampledSeries(buckets=4)
+    series.add(0.2, 1.0)
+    series.add(1.5, 3.0)
+    assert series.points() == [(0.0, 1.0, 1.0, 1.0), (1.0, 3.0, 3.0, 3.0)]
+
+
+# ------ store ------
+def test_store_keys_by_metric_and_device():
+    store = SeriesStore(buckets=4)
+    store.add("delay", 3, 1000.0, 10.0)
+    store.add("delay", ALL, 1000.0, 10.0)
+    store.add("value", 1, 1000.0, 20.0)
+    assert store.devices() == [1, 3]
+    assert store.get("delay", 3).points() == [(1000.0, 10.0, 10.0, 10.0)]
+    assert store.get("interval", 3) is None
+    store.clear()
+    assert store.devices() == []
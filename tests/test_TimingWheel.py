@@ -0,0 +1,70 @@
+from TimingWheel import TimingWheel
+
+
+# ------ expiry ------
+def test_key_is_due_at_its_deadline_not_before():
+    wheel = TimingWheel(1.0, slots=8)
+    wheel.schedule("a", 3.0)
+    assert wheel.advance(2.9) == []
+    assert wheel.advance(3.0) == ["a"]
+    assert len(wheel) == 0
+    assert wheel.advance(10.0) == []
+
+
+def test_deadline_in_the_past_is_due_on_the_next_tick():
+    wheel = TimingWheel(1.0, now=5.0)
+    wheel.schedule("a", 1.0)
+    assert wheel.advance(5.5) == []
+    assert wheel.advance(6.0) == ["a"]
+
+
+def test_deadline_more_than_one_turn_ahead_waits_for_its_turn():
+    wheel = TimingWheel(1.0, slots=8)
+    wheel.schedule("far", 20.0)
+    wheel.schedule("near", 4.0)
+    assert wheel.advance(4.0) == ["near"]
+    assert wheel.advance(12.0) == []        # passed the far key's bucket once already
+    assert wheel.advance(19.0) == []
+    assert wheel.advance(20.0) == ["far"]
+
+
+def test_jump_longer_than_a_turn_expires_everything_due():
+    wheel = TimingWheel(0.5, slots=4)
+    for i in range(20):
+        wheel.schedule(i, 1.0 + i * 0.5)
+    assert sorted(wheel.advance(100.0)) == list(range(20))
+
+
+# ------ re-arm / cancel ------
+def test_rearm_moves_the_deadline():
+    wheel = TimingWheel(1.0, slots=8)
+    wheel.schedule("a", 3.0)
+    wheel.schedule("a", 6.0)       # heartbeat arrived, deadline pushed back
+    assert len(wheel) == 1
+    assert wheel.advance(5.0) == []
+    assert wheel.advance(6.0) == ["a"]
+
+
+def test_rearm_earlier_and_across_buckets():
+    wheel = TimingWheel(1.0, slots=8)
+    wheel.schedule("a", 7.0)
+    wheel.schedule("a", 2.0)
+    assert wheel.advance(2.0) == ["a"]
+    assert wheel.advance(8.0) == []
+
+
+def test_cancel():
+    wheel = TimingWheel(1.0)
+    wheel.schedule("a", 2.0)
+    wheel.cancel("a")
+    wheel.cancel("missing")
+    assert len(wheel) == 0
+    assert wheel.advance(3.0) == []
+
+
+def test_expired_key_can_be_armed_again():
+    wheel = TimingWheel(1.0, slots=8)
+    wheel.schedule("a", 1.0)
+    assert wheel.advance(1.0) == ["a"]
+    wheel.schedule("a", 3.0)
+    assert wheel.advance(3.0) == ["a"]